@@ -1,3 +1,8 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
 class Environment:
 
     def __init__(
@@ -59,6 +64,7 @@ class Agent:
         # For online planning
         self.cur_belief = init_belief
         self.history = []
+        self.tree = None  # search tree of the planner, rooted at `history`
 
     def update_history(self, real_action, real_observation):
         """update_history(self, real_action, real_observation)"""
@@ -66,15 +72,16 @@ class Agent:
 
     def set_belief(self, belief, prior=False) -> None:
         """set_belief(self, belief, prior=False)"""
-        print("set belief", belief)
+        if logger.isEnabledFor(logging.DEBUG):  # printing a belief builds its histogram
+            logger.debug("set belief %s", belief)
         self.cur_belief = belief
         if prior:
             self.init_belief = belief
 
-    def sample_belief(self):
-        """sample_belief(self)
+    def sample_belief(self, rng=None):
+        """sample_belief(self, rng=None)
         Returns a state (:class:`State`) sampled from the belief."""
-        return self.cur_belief.random()
+        return self.cur_belief.random(rng)
 
     def valid_actions(self, state=None, history=None):
         return self.policy_model.get_all_actions(state=state, history=history)
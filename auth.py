@@ -0,0 +1,50 @@
+"""Keys of the `multiprocessing.connection` listeners of `server` and `distributed`.
+
+Their connections exchange pickles, so whoever can connect with the key can run
+code in the listening process: there is no default key. The command lines read
+it from the `POMCP_AUTHKEY` environment variable, or generate a fresh one when
+they only listen on a loopback address.
+"""
+
+import ipaddress
+import os
+import secrets
+import socket
+
+AUTHKEY_ENV = "POMCP_AUTHKEY"
+
+
+def generate_authkey() -> bytes:
+    return secrets.token_hex(16).encode()
+
+
+def check_authkey(authkey) -> None:
+    """Raises ValueError unless `authkey` is a non-empty bytes key."""
+    if not isinstance(authkey, bytes) or not authkey:
+        raise ValueError("a non-empty bytes authkey is required")
+
+
+def is_loopback(host) -> bool:
+    """True if every address `host` resolves to is a loopback address."""
+    if not host:  # "" binds all the interfaces
+        return False
+    try:
+        infos = socket.getaddrinfo(host, None)
+    except socket.gaierror:
+        return False
+    return all(ipaddress.ip_address(info[4][0]).is_loopback for info in infos)
+
+
+def cli_authkey(host) -> tuple:
+    """Returns (authkey, generated) for a command line listening on or
+    connecting to `host`: the key of `POMCP_AUTHKEY`, else a fresh key if
+    `host` is a loopback address. Raises ValueError otherwise."""
+    authkey = os.environ.get(AUTHKEY_ENV)
+    if authkey:
+        return authkey.encode(), False
+    if not is_loopback(host):
+        raise ValueError(
+            "%s is not a loopback address: set %s to the shared key"
+            % (host, AUTHKEY_ENV)
+        )
+    return generate_authkey(), True
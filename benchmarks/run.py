@@ -0,0 +1,305 @@
+"""Headless, seeded benchmarks of the planner and the battleship domain.
+
+Micro-benchmarks time single calls (seconds per call); macro-benchmarks measure
+POMCP simulations per second and reinvigoration time per move; startup
+benchmarks time the import of the main modules in a fresh interpreter. Results are
+written as JSON and compared against a baseline written earlier by the same
+script. The committed `benchmarks/baseline.json` (seed 0, scale 1) is the default;
+as timings depend on the machine, a baseline run locally compares more closely:
+
+    python -m benchmarks.run --output baseline.json
+    python -m benchmarks.run --output current.json --baseline baseline.json
+
+The comparison exits with status 1 if a result is worse than its baseline by
+more than `--tolerance` (relative).
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import timeit
+
+import numpy as np
+
+from agent import Agent
+from particles import Particles
+from pomcp import POUCT, POMCP, ORNode, ANDNode
+from rng import default_rng, reseed
+from envs.battleship.types import (
+    Action_Battleship,
+    Coord,
+    generate_random_state,
+)
+from envs.battleship.problem import Problem_Battleship
+from envs.battleship.mh_kernel import MHKernel_Battleship
+from envs.battleship.policy_model import PolicyModel_Battleship
+from envs.battleship.transition_model import TransitionModel_Battleship
+from envs.battleship.observation_model import ObservationModel_Battleship
+from envs.battleship.reward_model import RewardModel_Battleship
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def seed_all(seed) -> None:
+    random.seed(seed)
+    np.random.seed(seed)
+    reseed(seed)
+
+
+def make_agent(particles) -> Agent:
+    return Agent(
+        Particles(particles),
+        policy_model=PolicyModel_Battleship(),
+        transition_model=TransitionModel_Battleship(),
+        observation_model=ObservationModel_Battleship(),
+        reward_model=RewardModel_Battleship(),
+    )
+
+
+def make_history(true_state, num_moves) -> list:
+    """`num_moves` distinct random shots at `true_state` and their observations."""
+    observation_model = ObservationModel_Battleship()
+    cells = random.sample([(x, y) for x in range(10) for y in range(10)], num_moves)
+    history = []
+    for x, y in cells:
+        action = Action_Battleship(Coord(x, y))
+        history.append((action, observation_model.sample(true_state, action)))
+    return history
+
+
+def per_call(func, number, repeat=5) -> float:
+    """Best time of one call of `func` over `repeat` runs of `number` calls."""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def micro_benchmarks(seed, scale=1.0) -> dict:
+    def n(number):
+        return max(int(number * scale), 1)
+
+    seed_all(seed)
+    state = generate_random_state()
+    history = make_history(state, 10)  # state is consistent with it
+    coord = Coord(4, 4)
+    policy_model = PolicyModel_Battleship()
+    transform = Problem_Battleship.state_transform_func
+
+    root = ORNode(0)
+    for x in range(10):
+        for y in range(10):
+            root[Action_Battleship(Coord(x, y))] = ANDNode(
+                random.randint(1, 100), random.random()
+            )
+    root.num_visits = sum(root[a].num_visits for a in root.children)
+    planner = POUCT(make_agent([state]), c_UCB=10)
+
+    results = {
+        "is_occupied": per_call(lambda: state.is_occupied(coord), n(20000)),
+        "is_coherent_with_history": per_call(
+            lambda: state._is_coherent_with_history(history), n(2000)
+        ),
+        "generate_random_state": per_call(generate_random_state, n(500)),
+        "state_transform_func": per_call(
+            lambda: transform(state, history), n(50), repeat=3
+        ),
+        "mh_kernel": per_call(
+            lambda: MHKernel_Battleship()(state, history), n(50), repeat=3
+        ),
+        "get_all_actions": per_call(
+            lambda: policy_model.get_all_actions(state, history), n(20000)
+        ),
+        "ucb": per_call(lambda: planner._ucb(root), n(2000)),
+        "rollout_action": per_call(
+            lambda: policy_model.rollout(state, history), n(20000)
+        ),
+        "rng_sample_ships": per_call(
+            lambda: default_rng().sample(range(len(state.ships)), 4), n(20000)
+        ),
+    }
+    return {name: _result(value, "s/call", False) for name, value in results.items()}
+
+
+def plan_benchmark(seed, max_depth, num_particles, num_sims, repeat=3) -> float:
+    """Simulations per second of `POMCP.plan` from a random belief, best of
+    `repeat` plans with a fresh tree."""
+    seed_all(seed)
+    particles = [generate_random_state() for _ in range(num_particles)]
+    best_time = float("inf")
+    for _ in range(repeat):
+        agent = make_agent(list(particles))
+        planner = POMCP(
+            agent=agent,
+            max_depth=max_depth,
+            discount_factor=1.0,
+            num_sims=num_sims,
+            c_UCB=10,
+            rollout_policy=agent.policy_model,
+        )
+        start_time = time.perf_counter()
+        planner.plan()
+        best_time = min(best_time, time.perf_counter() - start_time)
+    return num_sims / best_time
+
+
+def reinvigoration_benchmark(seed, num_particles, num_sims, num_moves, transform):
+    """Mean time (seconds) of `POMCP.update` over the first `num_moves` moves of
+    a seeded game, most of which is particle reinvigoration."""
+    seed_all(seed)
+    true_state = generate_random_state()
+    agent = make_agent([generate_random_state() for _ in range(num_particles)])
+    planner = POMCP(
+        agent=agent,
+        max_depth=3,
+        discount_factor=1.0,
+        num_sims=num_sims,
+        c_UCB=10,
+        rollout_policy=agent.policy_model,
+        lazy_belief=True,  # never deprived of particles by an unexplored branch
+    )
+    observation_model = ObservationModel_Battleship()
+    times = []
+    for _ in range(num_moves):
+        action = planner.plan()
+        observation = observation_model.sample(true_state, action)
+        agent.update_history(action, observation)
+        start_time = time.perf_counter()
+        planner.update(agent, action, observation, transform)
+        times.append(time.perf_counter() - start_time)
+    return sum(times) / len(times)
+
+
+def macro_benchmarks(seed, scale=1.0) -> dict:
+    num_sims = max(int(1000 * scale), 10)
+    results = {}
+    for max_depth in (3, 5, 8):
+        for num_particles in (100, 1000):
+            name = "plan_depth%d_particles%d" % (max_depth, num_particles)
+            sims_per_second = plan_benchmark(seed, max_depth, num_particles, num_sims)
+            results[name] = _result(sims_per_second, "sims/s", True)
+
+    # the rejection-sampling `state_transform_func` can take unbounded time once
+    # ships are hit, so whole moves are measured with the MH kernel
+    seconds = reinvigoration_benchmark(
+        seed,
+        num_particles=100,
+        num_sims=num_sims,
+        num_moves=3,
+        transform=MHKernel_Battleship(),
+    )
+    results["reinvigoration_mh_kernel"] = _result(seconds, "s/move", False)
+    return results
+
+
+STARTUP_MODULES = ["pomcp", "envs.battleship.problem", "envs.tiger.problem"]
+
+_IMPORT_TIMER = """
+import sys, time
+start_time = time.perf_counter()
+import {module}
+print(time.perf_counter() - start_time, "pygame" in sys.modules)
+"""
+
+
+def startup_benchmarks(repeat=5) -> dict:
+    """Import time of each of STARTUP_MODULES in a fresh interpreter, best of
+    `repeat`. Also checks that none of them imports pygame."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = {}
+    for module in STARTUP_MODULES:
+        times = []
+        for _ in range(repeat):
+            output = subprocess.run(
+                [sys.executable, "-c", _IMPORT_TIMER.format(module=module)],
+                cwd=root,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.split()
+            times.append(float(output[0]))
+            if output[1] == "True":
+                print("Warning: importing %s imports pygame" % module)
+        results["import_" + module] = _result(min(times), "s", False)
+    return results
+
+
+def _result(value, unit, higher_is_better) -> dict:
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def compare(results, baseline, tolerance) -> list[str]:
+    """Returns the names of the results worse than their baseline by more
+    than `tolerance` (relative), printing a table of all of them."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            print(
+                "%-40s %12.4g %s (no baseline)"
+                % (name, result["value"], result["unit"])
+            )
+            continue
+        base = baseline[name]["value"]
+        change = (result["value"] - base) / base
+        if result["higher_is_better"]:
+            change = -change
+        flag = ""
+        if change > tolerance:
+            regressions.append(name)
+            flag = "REGRESSION"
+        print(
+            "%-40s %12.4g %s  baseline %12.4g  %+6.1f%% %s"
+            % (name, result["value"], result["unit"], base, 100 * change, flag)
+        )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="write the results as JSON")
+    parser.add_argument(
+        "--baseline",
+        default=BASELINE,
+        help="JSON results to compare to, or 'none'. Default: benchmarks/baseline.json",
+    )
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="scale the number of iterations"
+    )
+    parser.add_argument("--only", choices=["micro", "macro", "startup"], default=None)
+    args = parser.parse_args()
+
+    results = {}
+    if args.only in (None, "startup"):
+        results.update(startup_benchmarks())
+    if args.only in (None, "micro"):
+        results.update(micro_benchmarks(args.seed, args.scale))
+    if args.only in (None, "macro"):
+        results.update(macro_benchmarks(args.seed, args.scale))
+
+    report = {
+        "seed": args.seed,
+        "scale": args.scale,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    baseline = {}
+    if args.baseline != "none":
+        with open(args.baseline) as f:
+            baseline_report = json.load(f)
+        baseline = baseline_report["results"]
+        for key in ("seed", "scale"):
+            if baseline_report[key] != report[key]:
+                print("Warning: baseline was run with a different %s" % key)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("Regressions:", ", ".join(regressions))
+        sys.exit(1)
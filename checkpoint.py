@@ -0,0 +1,172 @@
+"""Search-tree checkpoints (.npz) for warm-starting POUCT/POMCP.
+
+The tree is stored as flat arrays in breadth-first order: one row per ORNode
+(visits, parent ANDNode, observation index) and one per ANDNode (visits, value,
+parent ORNode, action index). Actions and observations are stored once, in
+vocabularies, and referred to by index. The particles of the nodes that hold a
+belief (the root, and every ORNode in non-lazy POMCP) are concatenated into one
+array, with each node's slice given by an offset and a length (-1: no belief).
+
+Actions, observations and particles are stored as the flat arrays of a domain
+codec, e.g. `envs.battleship.encoding.BattleshipCodec`, and loaded without
+unpickling anything. A codec implements `encode_actions`, `encode_observations`
+and `encode_particles`, each turning a list into an array, and the matching
+`decode_*` methods. Domains without a codec can have them pickled instead, as
+object arrays, by passing `allow_pickle=True` to both `save_tree` and
+`load_tree`; only load such checkpoints from trusted sources.
+"""
+
+import copy
+
+import numpy as np
+
+from particles import Particles
+from pomcp import ANDNode, ORNode, ORNodeParticles, RootORNode, RootORNodeParticles
+
+
+def _object_array(values) -> np.ndarray:
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+class _PickleCodec:
+    """Stores the values as pickled object arrays."""
+
+    encode_actions = encode_observations = encode_particles = staticmethod(
+        _object_array
+    )
+    decode_actions = decode_observations = decode_particles = staticmethod(list)
+
+
+def _codec(codec, allow_pickle):
+    if codec is not None:
+        return codec
+    if not allow_pickle:
+        raise ValueError("A codec is required, or pickling with allow_pickle=True.")
+    return _PickleCodec
+
+
+def save_tree(path, tree, codec=None, allow_pickle=False) -> None:
+    """Writes the tree rooted at `tree` (a RootORNode) to `path`, encoded with
+    `codec` (pickled without one, if `allow_pickle`)."""
+    codec = _codec(codec, allow_pickle)
+    actions, observations = {}, {}
+
+    or_visits, or_parent, or_observation = [], [], []
+    belief_offset, belief_length, particles = [], [], []
+    and_visits, and_value, and_parent, and_action = [], [], [], []
+
+    ornodes = [(tree, -1, -1)]
+    for ornode, parent, observation in ornodes:  # grows while iterating: BFS
+        or_index = len(or_visits)
+        or_visits.append(ornode.num_visits)
+        or_parent.append(parent)
+        or_observation.append(observation)
+        belief = getattr(ornode, "belief", None)
+        belief_offset.append(len(particles))
+        belief_length.append(-1 if belief is None else len(belief))
+        if belief is not None:
+            particles.extend(belief)
+
+        for action, andnode in ornode.children.items():
+            and_index = len(and_visits)
+            and_visits.append(andnode.num_visits)
+            and_value.append(andnode.value)
+            and_parent.append(or_index)
+            and_action.append(actions.setdefault(action, len(actions)))
+            for o, child in andnode.children.items():
+                o_index = observations.setdefault(o, len(observations))
+                ornodes.append((child, and_index, o_index))
+
+    history = [
+        (
+            actions.setdefault(a, len(actions)),
+            observations.setdefault(o, len(observations)),
+        )
+        for a, o in tree.history
+    ]
+    np.savez(
+        path,
+        actions=codec.encode_actions(list(actions)),
+        observations=codec.encode_observations(list(observations)),
+        history=np.array(history, dtype=np.int32).reshape(-1, 2),
+        or_visits=np.array(or_visits, dtype=np.int64),
+        or_parent=np.array(or_parent, dtype=np.int32),
+        or_observation=np.array(or_observation, dtype=np.int32),
+        belief_offset=np.array(belief_offset, dtype=np.int64),
+        belief_length=np.array(belief_length, dtype=np.int64),
+        and_visits=np.array(and_visits, dtype=np.int64),
+        and_value=np.array(and_value, dtype=np.float64),
+        and_parent=np.array(and_parent, dtype=np.int32),
+        and_action=np.array(and_action, dtype=np.int32),
+        particles=codec.encode_particles(particles),
+    )
+
+
+def load_tree(path, codec=None, allow_pickle=False) -> RootORNode:
+    """Rebuilds a tree written by `save_tree` with the same `codec`; a pickled
+    checkpoint is only loaded with `allow_pickle`."""
+    codec = _codec(codec, allow_pickle)
+    with np.load(path, allow_pickle=codec is _PickleCodec) as data:
+        data = dict(data)
+    actions = codec.decode_actions(data["actions"])
+    observations = codec.decode_observations(data["observations"])
+    particles = codec.decode_particles(data["particles"])
+
+    ornodes = []
+    for i, (num_visits, offset, length) in enumerate(
+        zip(
+            data["or_visits"].tolist(),
+            data["belief_offset"].tolist(),
+            data["belief_length"].tolist(),
+        )
+    ):
+        belief = None
+        if length >= 0:
+            belief = Particles(particles[offset : offset + length])
+        if i == 0:
+            history = [(actions[a], observations[o]) for a, o in data["history"]]
+            if belief is None:
+                ornode = RootORNode(num_visits, history)
+            else:
+                ornode = RootORNodeParticles(num_visits, history, belief)
+        elif belief is None:
+            ornode = ORNode(num_visits)
+        else:
+            ornode = ORNodeParticles(num_visits, belief)
+        ornodes.append(ornode)
+
+    andnodes = []
+    for num_visits, value, parent, action in zip(
+        data["and_visits"].tolist(),
+        data["and_value"].tolist(),
+        data["and_parent"].tolist(),
+        data["and_action"].tolist(),
+    ):
+        andnode = ANDNode(num_visits, value)
+        ornodes[parent][actions[action]] = andnode
+        andnodes.append(andnode)
+
+    for ornode, parent, observation in zip(
+        ornodes[1:], data["or_parent"][1:].tolist(), data["or_observation"][1:].tolist()
+    ):
+        andnodes[parent][observations[observation]] = ornode
+    return ornodes[0]
+
+
+def warm_start(planner, path, codec=None, allow_pickle=False) -> None:
+    """Loads a checkpoint as the search tree of `planner`'s agent, whose history
+    must be the one of the checkpoint. The agent's belief is set to the root
+    belief of the checkpoint, if it has one."""
+    tree = load_tree(path, codec, allow_pickle)
+    agent = planner.agent
+    if tree.history != agent.history:
+        raise ValueError("The checkpoint was saved for another history.")
+    belief = getattr(tree, "belief", None)
+    if belief is not None:
+        # the tree keeps its own copy, as after POMCP.update
+        agent.set_belief(copy.deepcopy(belief))
+        if getattr(planner, "_lazy_belief", False):
+            tree.belief = agent.cur_belief
+    agent.tree = tree
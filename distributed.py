@@ -0,0 +1,268 @@
+"""Root-parallel POMCP over TCP worker servers.
+
+Each worker runs an independent POMCP search from the broadcast root belief
+and history, and returns the statistics of the root: the visit count and value
+of each action's ANDNode. The coordinator merges them (visits are summed and
+values averaged with visit weights) and picks the action with
+`ORNode.select_best_action`.
+
+The belief is sent in its compact encoding (`envs.battleship.encoding`), or, for
+workers on the same host, published once in shared memory that they map.
+
+The connections are authenticated with a shared key (see `auth`); a worker
+listening on a non-loopback address takes it from `POMCP_AUTHKEY`:
+
+    POMCP_AUTHKEY=... python distributed.py worker --host 0.0.0.0 --port 6001
+    python distributed.py demo --workers 3
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+import argparse
+import multiprocessing
+import threading
+import time
+
+from agent import Agent
+from auth import check_authkey, cli_authkey, generate_authkey
+from pomcp import POMCP, ORNode, ANDNode
+from rng import RNG
+from envs.battleship.types import generate_random_state
+from envs.battleship.encoding import (
+    EncodedParticles,
+    SharedParticles,
+    encode_particles,
+)
+from envs.battleship.policy_model import PolicyModel_Battleship
+from envs.battleship.transition_model import TransitionModel_Battleship
+from envs.battleship.observation_model import ObservationModel_Battleship
+from envs.battleship.reward_model import RewardModel_Battleship
+
+
+def make_battleship_agent(belief, history, rng=None) -> Agent:
+    agent = Agent(
+        belief,
+        policy_model=PolicyModel_Battleship(rng),
+        transition_model=TransitionModel_Battleship(),
+        observation_model=ObservationModel_Battleship(),
+        reward_model=RewardModel_Battleship(),
+    )
+    agent.history = list(history)
+    return agent
+
+
+def root_statistics(tree) -> dict:
+    """Maps each root action to (num_visits, value) of its ANDNode."""
+    return {
+        action: (tree[action].num_visits, tree[action].value)
+        for action in tree.children
+    }
+
+
+def search_root(belief, history, planner_config, seed, make_agent) -> dict:
+    """Runs one POMCP search from the given root; returns `root_statistics`.
+    The search draws from its own stream: the threads of a worker share no state."""
+    rng = RNG(seed)
+    agent = make_agent(belief, history, rng)
+    # the search never updates the belief, so the root particles need no copy
+    planner_config = dict(planner_config, lazy_belief=True)
+    planner = POMCP(
+        agent=agent, rollout_policy=agent.policy_model, rng=rng, **planner_config
+    )
+    planner.plan()
+    return root_statistics(agent.tree)
+
+
+def merge_root_statistics(all_stats) -> ORNode:
+    """Merges the root statistics of several searches into one root ORNode:
+    visits are summed, values averaged with visit weights."""
+    root = ORNode(0)
+    for stats in all_stats:
+        for action, (num_visits, value) in stats.items():
+            if root[action] is None:
+                root[action] = ANDNode(0, value)
+            node = root[action]
+            if num_visits > 0:
+                node.value = (node.value * node.num_visits + value * num_visits) / (
+                    node.num_visits + num_visits
+                )
+                node.num_visits += num_visits
+            root.num_visits += num_visits
+    return root
+
+
+def serve_worker(address, authkey, make_agent=make_battleship_agent) -> None:
+    """Serves root searches on `address`, one thread per coordinator connection
+    authenticated with `authkey`."""
+    check_authkey(authkey)
+    with Listener(address, authkey=authkey) as listener:
+        while True:
+            try:
+                conn = listener.accept()
+            except AuthenticationError:
+                continue  # a client with the wrong key
+            threading.Thread(
+                target=_serve_coordinator, args=(conn, make_agent), daemon=True
+            ).start()
+
+
+def _serve_coordinator(conn, make_agent) -> None:
+    with conn:
+        while True:
+            try:
+                particles, history, planner_config, seed = conn.recv()
+            except EOFError:
+                return
+            if isinstance(particles, tuple):  # ("shm", name, n)
+                belief = SharedParticles.attach(*particles[1:])
+            else:
+                belief = EncodedParticles(particles)
+            try:
+                stats = search_root(belief, history, planner_config, seed, make_agent)
+            except Exception as e:
+                conn.send((False, e))
+            else:
+                conn.send((True, stats))
+            finally:
+                if isinstance(belief, SharedParticles):
+                    belief.close()
+
+
+class RootParallelCoordinator:
+    """
+    Fans a planning request out to worker servers and merges their root statistics.
+
+    Args:
+        addresses (list): (host, port) of each worker started with `serve_worker`.
+        planner_config (dict): keyword arguments of each worker's `POMCP`.
+        authkey (bytes): key the workers were started with.
+    """
+
+    def __init__(self, addresses, planner_config, authkey) -> None:
+        self.planner_config = planner_config
+        self._conns = []
+        try:
+            for address in addresses:
+                self._conns.append(Client(address, authkey=authkey))
+        except BaseException:
+            for conn in self._conns:
+                conn.close()
+            raise
+        self._pool = ThreadPoolExecutor(max_workers=len(self._conns))
+        self._last_root = None
+
+    def _request(self, conn, particles, history, seed) -> dict:
+        conn.send((particles, history, self.planner_config, seed))
+        ok, result = conn.recv()
+        if not ok:
+            raise result
+        return result
+
+    def plan(self, particles, history, seed=None, shared=False):
+        """Returns the best action for the root belief `particles` and `history`.
+        With `shared`, the belief is published in shared memory instead of being
+        sent; all the workers must then run on this host.
+        The merged root is kept in `_last_root`."""
+        shm = None
+        if shared:
+            shm = SharedParticles.publish(particles)
+            payload = ("shm", shm.name, len(shm))
+        else:
+            payload = encode_particles(particles)
+
+        streams = RNG(seed).spawn(len(self._conns))
+        try:
+            futures = [
+                self._pool.submit(
+                    self._request,
+                    conn,
+                    payload,
+                    list(history),
+                    stream.seed_seq,
+                )
+                for conn, stream in zip(self._conns, streams)
+            ]
+            all_stats = [f.result() for f in futures]
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        self._last_root = merge_root_statistics(all_stats)
+        return self._last_root.select_best_action()
+
+    def close(self) -> None:
+        for conn in self._conns:
+            conn.close()
+        self._pool.shutdown()
+
+
+def spawn_local_workers(num_workers, authkey, base_port=6001) -> tuple:
+    """Starts `num_workers` worker servers on localhost; returns (processes, addresses)."""
+    addresses = [("localhost", base_port + i) for i in range(num_workers)]
+    processes = [
+        multiprocessing.Process(
+            target=serve_worker, args=(address, authkey), daemon=True
+        )
+        for address in addresses
+    ]
+    for process in processes:
+        process.start()
+    return processes, addresses
+
+
+def _connect(
+    addresses, planner_config, authkey, timeout=10.0
+) -> RootParallelCoordinator:
+    """Connects to workers that may still be starting up; the connections of a
+    failed attempt are closed by `RootParallelCoordinator`."""
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return RootParallelCoordinator(addresses, planner_config, authkey)
+        except ConnectionRefusedError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("mode", choices=["worker", "demo"])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6001)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--particles", type=int, default=200)
+    parser.add_argument("--num-sims", type=int, default=500)
+    parser.add_argument("--shared", action="store_true", help="use shared memory")
+    args = parser.parse_args()
+
+    if args.mode == "worker":
+        try:
+            authkey, generated = cli_authkey(args.host)
+        except ValueError as e:
+            parser.error(str(e))
+        if generated:
+            print(">> Authkey:", authkey.decode())
+        serve_worker((args.host, args.port), authkey)
+    else:
+        authkey = generate_authkey()
+        processes, addresses = spawn_local_workers(args.workers, authkey, args.port)
+        config = {
+            "max_depth": 5,
+            "discount_factor": 1.0,
+            "num_sims": args.num_sims,
+            "c_UCB": 10,
+        }
+        coordinator = _connect(addresses, config, authkey)
+        particles = [generate_random_state() for _ in range(args.particles)]
+
+        start_time = time.time()
+        action = coordinator.plan(particles, [], seed=0, shared=args.shared)
+        root = coordinator._last_root
+        print(">> Action:", action)
+        print(">> Visits:", root.num_visits, "value:", root[action].value)
+        print(">> Time:", time.time() - start_time)
+        coordinator.close()
+        for process in processes:
+            process.terminate()
@@ -0,0 +1,181 @@
+from envs.battleship.types import (
+    Action_Battleship,
+    Observation_Battleship,
+    State_Battleship,
+    Ship,
+    Coord,
+    Compass,
+    BOARD_SIZE,
+)
+from multiprocessing import resource_tracker, shared_memory
+from rng import default_rng
+import numpy as np
+import threading
+
+NUM_SHIPS = 5
+SHIP_FIELDS = 4  # x, y, direction, length
+DIRECTIONS = [Compass.North, Compass.East, Compass.South, Compass.West]
+_DIRECTION_INDEX = {(d.value.x, d.value.y): i for i, d in enumerate(DIRECTIONS)}
+OBSERVATIONS = ["miss", "hit"]
+_register_lock = threading.Lock()  # guards `resource_tracker.register`
+
+
+def encode_state(state: State_Battleship) -> np.ndarray:
+    """Fixed-width encoding of a fleet: one (x, y, direction, length) row per ship."""
+    if len(state.ships) != NUM_SHIPS:
+        raise ValueError("Expected %d ships, got %d" % (NUM_SHIPS, len(state.ships)))
+    return np.array(
+        [
+            (
+                ship.pos.x,
+                ship.pos.y,
+                _DIRECTION_INDEX[(ship.direction.x, ship.direction.y)],
+                ship.length,
+            )
+            for ship in state.ships
+        ],
+        dtype=np.uint8,
+    )
+
+
+def decode_state(row) -> State_Battleship:
+    return State_Battleship(
+        [
+            Ship(Coord(int(x), int(y)), DIRECTIONS[d].value, int(length))
+            for x, y, d, length in row
+        ]
+    )
+
+
+def encode_particles(particles) -> np.ndarray:
+    """Encodes an iterable of states as a (n, NUM_SHIPS, SHIP_FIELDS) uint8 array."""
+    particles = list(particles)
+    array = np.empty((len(particles), NUM_SHIPS, SHIP_FIELDS), dtype=np.uint8)
+    for i, state in enumerate(particles):
+        array[i] = encode_state(state)
+    return array
+
+
+def decode_particles(array) -> list[State_Battleship]:
+    return [decode_state(row) for row in array]
+
+
+class BattleshipCodec:
+    """Integer codes of battleship actions (`x * BOARD_SIZE + y`) and observations
+    (index in `OBSERVATIONS`), and the particle encoding above; a codec for
+    `checkpoint`."""
+
+    @staticmethod
+    def encode_actions(actions) -> np.ndarray:
+        return np.array(
+            [a.coord.x * BOARD_SIZE + a.coord.y for a in actions], dtype=np.uint8
+        )
+
+    @staticmethod
+    def decode_actions(codes) -> list[Action_Battleship]:
+        return [
+            Action_Battleship(Coord(*divmod(int(code), BOARD_SIZE))) for code in codes
+        ]
+
+    @staticmethod
+    def encode_observations(observations) -> np.ndarray:
+        return np.array([OBSERVATIONS.index(o.name) for o in observations], np.uint8)
+
+    @staticmethod
+    def decode_observations(codes) -> list[Observation_Battleship]:
+        return [Observation_Battleship(OBSERVATIONS[int(code)]) for code in codes]
+
+    encode_particles = staticmethod(encode_particles)
+    decode_particles = staticmethod(decode_particles)
+
+
+class EncodedParticles:
+    """
+    Read-only particle belief backed by an encoded array (see `encode_particles`).
+
+    Particles are decoded on first access and cached, so sampling from the belief
+    (what `Agent.sample_belief` needs) only decodes the states actually drawn.
+    """
+
+    def __init__(self, array: np.ndarray) -> None:
+        self.array = array
+        self._decoded = {}
+
+    def __len__(self) -> int:
+        return len(self.array)
+
+    def __getitem__(self, index) -> State_Battleship:
+        if index not in self._decoded:
+            self._decoded[index] = decode_state(self.array[index])
+        return self._decoded[index]
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    @property
+    def particles(self) -> list[State_Battleship]:
+        return list(self)
+
+    def random(self, rng=None) -> State_Battleship | None:
+        """Samples a value based on the particles"""
+        if rng is None:
+            rng = default_rng()
+        if len(self) > 0:
+            return self[rng.randrange(len(self))]
+        else:
+            return None
+
+
+class SharedParticles(EncodedParticles):
+    """
+    Encoded particle belief published in `multiprocessing.shared_memory`.
+
+    The publishing process calls `publish` and sends `name` and `len` to the
+    workers, which `attach` to map the same memory without copying it. Each
+    process calls `close` when done; the publisher also calls `unlink`.
+    """
+
+    def __init__(self, shm, n) -> None:
+        self._shm = shm
+        array = np.ndarray((n, NUM_SHIPS, SHIP_FIELDS), dtype=np.uint8, buffer=shm.buf)
+        super().__init__(array)
+
+    @classmethod
+    def publish(cls, particles) -> "SharedParticles":
+        encoded = encode_particles(particles)
+        with _register_lock:  # not while an attach has registration disabled
+            shm = shared_memory.SharedMemory(create=True, size=max(encoded.nbytes, 1))
+        shared = cls(shm, len(encoded))
+        shared.array[:] = encoded
+        return shared
+
+    @classmethod
+    def attach(cls, name, n) -> "SharedParticles":
+        # only the publisher owns the memory: it must not be tracked here, or it
+        # would be unlinked when this process exits
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+        except TypeError:
+            # unregistering after attaching would also drop the publisher's
+            # entry from a tracker shared through fork, so registration is
+            # skipped; the lock keeps concurrent attaches from restoring the
+            # no-op as the original
+            with _register_lock:
+                register = resource_tracker.register
+                resource_tracker.register = lambda name, rtype: None
+                try:
+                    shm = shared_memory.SharedMemory(name=name)
+                finally:
+                    resource_tracker.register = register
+        return cls(shm, n)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def close(self) -> None:
+        self.array = None
+        self._shm.close()
+
+    def unlink(self) -> None:
+        self._shm.unlink()
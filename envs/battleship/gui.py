@@ -1,11 +1,16 @@
 import os
 import pygame
-from envs.battleship.coord import Coord, Tile
+from envs.battleship.types import Coord
 
 PATH = os.path.split(__file__)[0]
 FILE_PATH = os.path.join(PATH, "assets")
 
 
+class Tile:
+    def __init__(self, coord):
+        self.coord = coord
+
+
 class GuiTile(Tile):
     _borderWidth = 2
     _borderColor = pygame.Color("grey")
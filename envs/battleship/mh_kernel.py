@@ -0,0 +1,141 @@
+from envs.battleship.types import (
+    State_Battleship,
+    Action_Battleship,
+    Observation_Battleship,
+)
+from rng import default_rng
+import time
+
+
+class MHKernel_Battleship:
+    """Metropolis-Hastings reinvigoration kernel, usable as a `state_transform_func`.
+
+    Proposals are the `_ship_swap`, `_ship_merge` and `_ship_move` moves. The target
+    is uniform over the valid states coherent with the history (observations are
+    deterministic), and the proposals are taken as symmetric, so a proposal is
+    accepted iff it is coherent with the history.
+
+    Each call runs the chain `num_steps` steps from the particle: a step draws one
+    move and one candidate, and moves to it if it is accepted, else stays on the
+    current state. The move mix follows the observed acceptance rates, and is
+    fixed for the length of a chain.
+
+    Args:
+        num_steps (int): steps of the chain per particle. Default: 10.
+        adapt (bool): pick moves in proportion to their acceptance rate. Default: True.
+        min_weight (float): floor on the probability of each move. Default: 0.05.
+        rng (RNG): random stream of the proposals when the call passes none.
+            Default: `default_rng()`.
+    """
+
+    MOVES = ("swap", "merge", "move")
+
+    def __init__(
+        self,
+        num_steps=10,
+        adapt=True,
+        min_weight=0.05,
+        rng=None,
+    ) -> None:
+        self.num_steps = num_steps
+        self.adapt = adapt
+        self.min_weight = min_weight
+        self.rng = rng if rng is not None else default_rng()
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.proposals = {move: 0 for move in self.MOVES}
+        self.accepts = {move: 0 for move in self.MOVES}
+        self.latency = {move: 0.0 for move in self.MOVES}
+        self.stalls = 0  # chains that rejected every step
+
+    def counters(self) -> dict:
+        return {
+            "proposals": dict(self.proposals),
+            "accepts": dict(self.accepts),
+            "latency": dict(self.latency),
+            "stalls": self.stalls,
+        }
+
+    def merge_counters(self, counters: dict, since: dict | None = None) -> None:
+        """Adds the counters gathered by a copy of this kernel (e.g. in a worker
+        process) after the copy's counters were `since`."""
+        if since is None:
+            since = {
+                "proposals": dict.fromkeys(self.MOVES, 0),
+                "accepts": dict.fromkeys(self.MOVES, 0),
+                "latency": dict.fromkeys(self.MOVES, 0.0),
+                "stalls": 0,
+            }
+        for move in self.MOVES:
+            self.proposals[move] += (
+                counters["proposals"][move] - since["proposals"][move]
+            )
+            self.accepts[move] += counters["accepts"][move] - since["accepts"][move]
+            self.latency[move] += counters["latency"][move] - since["latency"][move]
+        self.stalls += counters["stalls"] - since["stalls"]
+
+    def stats(self) -> dict:
+        """Per-move acceptance rate and mean latency (seconds) of a proposal."""
+        stats = {}
+        for move in self.MOVES:
+            n = self.proposals[move]
+            stats[move] = {
+                "proposals": n,
+                "acceptance_rate": self.accepts[move] / n if n else 0.0,
+                "mean_latency": self.latency[move] / n if n else 0.0,
+            }
+        stats["stalls"] = self.stalls
+        return stats
+
+    def weights(self) -> list[float]:
+        if not self.adapt:
+            return [1 / len(self.MOVES)] * len(self.MOVES)
+        # Laplace-smoothed acceptance rates, floored so no move is starved
+        rates = [
+            (self.accepts[move] + 1) / (self.proposals[move] + 2) for move in self.MOVES
+        ]
+        total = sum(rates)
+        weights = [max(rate / total, self.min_weight) for rate in rates]
+        total = sum(weights)
+        return [weight / total for weight in weights]
+
+    def __call__(
+        self,
+        state: State_Battleship,
+        history: list[tuple[Action_Battleship, Observation_Battleship]],
+        rng=None,
+    ) -> State_Battleship:
+        """Runs the chain from `state`; draws from `rng` if given, else `self.rng`."""
+        if rng is None:
+            rng = self.rng
+        weights = self.weights()
+        moved = False
+        for _ in range(self.num_steps):
+            move = rng.choices(self.MOVES, weights)
+            start_time = time.perf_counter()
+            next_state = self._propose(move, state, history, rng)
+            self.latency[move] += time.perf_counter() - start_time
+            self.proposals[move] += 1
+            if next_state is not None:
+                self.accepts[move] += 1
+                state = next_state
+                moved = True
+        if not moved:
+            self.stalls += 1
+        return state
+
+    def _propose(self, move, state, history, rng) -> State_Battleship | None:
+        """Draws one candidate of `move`; returns it if it is accepted, None
+        otherwise."""
+        if move == "swap":
+            candidate = state._ship_swap(rng, max_tries=1)
+        elif move == "merge":
+            candidates = state._ship_merge(rng, max_tries=1)
+            candidate = rng.choice(candidates) if candidates else None
+        else:
+            candidate = state._ship_move(rng, max_tries=1)
+        # an invalid candidate was not drawn; coherence implies validity
+        if candidate is None or not candidate._is_coherent_with_history(history):
+            return None
+        return candidate
@@ -3,6 +3,7 @@ from envs.battleship.types import (
     Action_Battleship,
     State_Battleship,
 )
+import numpy as np
 
 
 class ObservationModel_Battleship:
@@ -13,3 +14,13 @@ class ObservationModel_Battleship:
             return Observation_Battleship("hit")
         else:
             return Observation_Battleship("miss")
+
+    def sample_batch(self, next_states, actions) -> np.ndarray:
+        grids = np.stack([s.occupancy() for s in next_states])
+        xs = np.fromiter((a.coord.x for a in actions), dtype=np.intp)
+        ys = np.fromiter((a.coord.y for a in actions), dtype=np.intp)
+        hits = grids[np.arange(len(grids)), xs, ys]
+
+        outcomes = np.empty(2, dtype=object)
+        outcomes[:] = [Observation_Battleship("miss"), Observation_Battleship("hit")]
+        return outcomes[hits.astype(np.intp)]
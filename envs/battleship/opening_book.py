@@ -0,0 +1,206 @@
+"""Opening book for battleship: the planner's choice for the first moves of a game,
+searched offline for every hit/miss outcome.
+
+Entries are keyed by the canonical form of the history, the sorted set of
+(cell, hit) shots, since a battleship belief does not depend on the order of
+the shots. They are stored sorted by key in a .npy file that is memory-mapped
+and binary-searched, so that loading a book costs nothing per game.
+
+    python -m envs.battleship.opening_book --moves 4 --output book.npy
+"""
+
+from envs.battleship.types import (
+    Action_Battleship,
+    Observation_Battleship,
+    Coord,
+    BOARD_SIZE,
+    generate_random_state,
+)
+from envs.battleship.mh_kernel import MHKernel_Battleship
+from envs.battleship.policy_model import PolicyModel_Battleship
+from envs.battleship.transition_model import TransitionModel_Battleship
+from envs.battleship.observation_model import ObservationModel_Battleship
+from envs.battleship.reward_model import RewardModel_Battleship
+from agent import Agent
+from particles import Particles, particle_reinvigoration
+from pomcp import POMCP
+from rng import reseed
+import argparse
+import numpy as np
+
+NUM_CELLS = BOARD_SIZE * BOARD_SIZE
+MAX_BOOK_MOVES = 8  # one byte per shot in a 64-bit key
+
+BOOK_DTYPE = np.dtype(
+    [
+        ("key", "<u8"),
+        ("action", "u1"),  # cell x * BOARD_SIZE + y
+        ("visits", "<u4", (NUM_CELLS,)),  # root statistics by cell
+        ("values", "<f4", (NUM_CELLS,)),
+    ]
+)
+
+DEFAULT_BOOK_CONFIG = {
+    "max_depth": 8,
+    "discount_factor": 1.0,
+    "num_sims": 20000,
+    "c_UCB": 10,
+    "value_init": 0,
+}
+
+
+def history_key(history) -> int | None:
+    """Canonical key of a history, or None if it is too long for the book."""
+    if len(history) > MAX_BOOK_MOVES:
+        return None
+    shots = sorted(
+        2 * (a.coord.x * BOARD_SIZE + a.coord.y) + (o.name == "hit") for a, o in history
+    )
+    key = 0
+    for shot in shots:
+        key = (key << 8) | (shot + 1)  # never 0, so that lengths differ
+    return key
+
+
+class OpeningBook:
+    """
+    Read-only opening book; `lookup` is what `POUCT(opening_book=...)` calls.
+
+    Args:
+        path (str): book written by `build_opening_book`.
+    """
+
+    def __init__(self, path) -> None:
+        self.entries = np.load(path, mmap_mode="r")
+        self._keys = self.entries["key"]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _find(self, history):
+        key = history_key(history)
+        if key is None:
+            return None
+        i = int(np.searchsorted(self._keys, key))
+        if i == len(self._keys) or self._keys[i] != key:
+            return None
+        return self.entries[i]
+
+    def lookup(self, history) -> Action_Battleship | None:
+        """Returns the book action after `history`, or None if it is not in the book."""
+        entry = self._find(history)
+        if entry is None:
+            return None
+        return Action_Battleship(Coord(*divmod(int(entry["action"]), BOARD_SIZE)))
+
+    def root_statistics(self, history) -> dict | None:
+        """Maps each searched action to (num_visits, value) at the root, as
+        `distributed.root_statistics`."""
+        entry = self._find(history)
+        if entry is None:
+            return None
+        return {
+            Action_Battleship(Coord(*divmod(cell, BOARD_SIZE))): (
+                int(entry["visits"][cell]),
+                float(entry["values"][cell]),
+            )
+            for cell in np.flatnonzero(entry["visits"])
+        }
+
+
+def _book_belief(prior, history, num_particles) -> Particles | None:
+    """Prior particles consistent with `history`, topped up by MH moves."""
+    particles = [
+        s
+        for s in prior
+        if all(
+            s.occupancy()[a.coord.x, a.coord.y] == (o.name == "hit") for a, o in history
+        )
+    ]
+    if not particles:
+        return None
+    return particle_reinvigoration(
+        Particles(particles), num_particles, history, MHKernel_Battleship()
+    )
+
+
+def build_opening_book(
+    path,
+    num_moves=4,
+    num_particles=1000,
+    prior_size=20000,
+    planner_config=None,
+    seed=0,
+) -> int:
+    """Searches the first `num_moves` moves for every hit/miss outcome and writes
+    the book to `path`. Each belief is the subset of `prior_size` random states
+    consistent with the history, topped up to `num_particles`. Returns the
+    number of entries."""
+    if num_moves > MAX_BOOK_MOVES:
+        raise ValueError("At most %d book moves" % MAX_BOOK_MOVES)
+    if planner_config is None:
+        planner_config = DEFAULT_BOOK_CONFIG
+    reseed(seed)
+    prior = [generate_random_state() for _ in range(prior_size)]
+
+    entries = {}
+    frontier = [[]]
+    for _ in range(num_moves):
+        next_frontier = []
+        for history in frontier:
+            key = history_key(history)
+            if key in entries:
+                continue
+            belief = _book_belief(prior, history, num_particles)
+            if belief is None:
+                continue  # impossible outcome
+            agent = Agent(
+                belief,
+                policy_model=PolicyModel_Battleship(),
+                transition_model=TransitionModel_Battleship(),
+                observation_model=ObservationModel_Battleship(),
+                reward_model=RewardModel_Battleship(),
+            )
+            agent.history = list(history)
+            planner = POMCP(
+                agent=agent,
+                rollout_policy=agent.policy_model,
+                lazy_belief=True,
+                **planner_config,
+            )
+            action = planner.plan()
+
+            entry = np.zeros((), dtype=BOOK_DTYPE)
+            entry["key"] = key
+            entry["action"] = action.coord.x * BOARD_SIZE + action.coord.y
+            for a in agent.tree.children:
+                cell = a.coord.x * BOARD_SIZE + a.coord.y
+                entry["visits"][cell] = agent.tree[a].num_visits
+                entry["values"][cell] = agent.tree[a].value
+            entries[key] = entry
+
+            for name in ("hit", "miss"):
+                observation = Observation_Battleship(name)
+                next_frontier.append(history + [(action, observation)])
+        frontier = next_frontier
+
+    book = np.array([entries[key] for key in sorted(entries)], dtype=BOOK_DTYPE)
+    np.save(path, book)
+    return len(book)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="opening_book.npy")
+    parser.add_argument("--moves", type=int, default=4)
+    parser.add_argument("--particles", type=int, default=1000)
+    parser.add_argument("--prior", type=int, default=20000)
+    parser.add_argument("--num-sims", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = dict(DEFAULT_BOOK_CONFIG, num_sims=args.num_sims)
+    num_entries = build_opening_book(
+        args.output, args.moves, args.particles, args.prior, config, args.seed
+    )
+    print("%d entries written to %s" % (num_entries, args.output))
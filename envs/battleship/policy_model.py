@@ -5,16 +5,19 @@ from envs.battleship.types import (
     Observation_Battleship,
     get_occupation_coords,
 )
-import random
+from rng import default_rng
 
 
 class PolicyModel_Battleship:
+    def __init__(self, rng=None):
+        self.rng = rng if rng is not None else default_rng()
+
     def rollout(
         self,
         state: State_Battleship,
         history: list[tuple[Action_Battleship, Observation_Battleship]],
     ) -> Action_Battleship:
-        return random.choice(self.get_all_actions(state, history))
+        return self.rng.choice(self.get_all_actions(state, history))
 
     def get_all_actions(
         self,
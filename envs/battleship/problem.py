@@ -10,15 +10,17 @@ from envs.battleship.transition_model import TransitionModel_Battleship
 from envs.battleship.policy_model import PolicyModel_Battleship
 
 from agent import Agent, Environment
-import random
+from rng import default_rng
 import copy
 
 
 class Problem_Battleship:
-    def __init__(self, init_true_state: State_Battleship, init_belief) -> None:
+    def __init__(
+        self, init_true_state: State_Battleship, init_belief, rng=None
+    ) -> None:
         self.agent = Agent(
             init_belief,
-            policy_model=PolicyModel_Battleship(),
+            policy_model=PolicyModel_Battleship(rng),
             transition_model=TransitionModel_Battleship(),
             reward_model=RewardModel_Battleship(),
             observation_model=ObservationModel_Battleship(),
@@ -29,42 +31,44 @@ class Problem_Battleship:
             reward_model=RewardModel_Battleship(),
         )
 
+    @staticmethod
     def state_transform_func(
-        self,
         state: State_Battleship,
         history: list[tuple[Action_Battleship, Observation_Battleship]],
+        rng=None,
     ) -> State_Battleship:
-        r = random.randint(0, 2)
+        if rng is None:
+            rng = default_rng()
+        r = rng.randint(0, 2)
 
         if r == 0:
-            next_state = state._ship_swap()
-            while not next_state._is_coherent_with_history(history):
-                next_state = state._ship_swap()
+            next_state = state._ship_swap(rng)
+            while next_state is None or not next_state._is_coherent_with_history(
+                history
+            ):
+                next_state = state._ship_swap(rng)
             return next_state
 
         elif r == 1:
-            next_state_candidates = state._ship_merge()
-            k = 0
-            while not any(
-                next_state._is_coherent_with_history(history) and next_state._is_valid()
-                for next_state in next_state_candidates
-            ):
-                next_state_candidates = state._ship_merge()
-
-            next_state = random.choice(
-                [
+            # coherence implies validity; check each candidate once
+            coherent = []
+            while not coherent:
+                candidates = state._ship_merge(rng)
+                if candidates is None:
+                    return state  # no two ships fit in a larger one
+                coherent = [
                     next_state
-                    for next_state in next_state_candidates
+                    for next_state in candidates
                     if next_state._is_coherent_with_history(history)
-                    and next_state._is_valid()
                 ]
-            )
-            return next_state
+            return rng.choice(coherent)
 
         elif r == 2:
-            next_state = state._ship_move()
-            while not next_state._is_coherent_with_history(history):
-                next_state = state._ship_move()
+            next_state = state._ship_move(rng)
+            while next_state is None or not next_state._is_coherent_with_history(
+                history
+            ):
+                next_state = state._ship_move(rng)
             return next_state
         else:
             return state
@@ -0,0 +1,184 @@
+"""Pygame rendering of battleship states; imported on first `render` call.
+
+`BoardRenderer` keeps the window, fonts and cell surfaces, and redraws only the
+cells that changed since the last frame. `RenderProcess` runs one in its own
+process, fed through a queue, so that drawing never holds up planning.
+"""
+
+from envs.battleship.types import State_Battleship, BOARD_SIZE
+from queue import Empty
+import multiprocessing
+import numpy as np
+import pygame
+
+CELL_SIZE = 40
+MARGIN = 10
+WINDOW_SIZE = (
+    BOARD_SIZE * (CELL_SIZE + MARGIN) + MARGIN,
+    BOARD_SIZE * (CELL_SIZE + MARGIN) + MARGIN,
+)
+
+# cell contents, by drawing priority: shots cover ships, ships cover water
+WATER, SHIP, MISS, HIT = range(4)
+CELL_COLORS = ["lightblue", "gray", "blue", "red"]
+
+
+def cell_rect(x, y) -> pygame.Rect:
+    return pygame.Rect(
+        MARGIN + x * (CELL_SIZE + MARGIN),
+        MARGIN + y * (CELL_SIZE + MARGIN),
+        CELL_SIZE,
+        CELL_SIZE,
+    )
+
+
+class BoardRenderer:
+    """Battleship window drawing the true fleet and the shots taken at it."""
+
+    def __init__(self) -> None:
+        pygame.init()
+        self.screen = pygame.display.set_mode(WINDOW_SIZE)
+        pygame.display.set_caption("Battleship")
+        self.font = pygame.font.SysFont(None, 24)
+        self.tiles = []
+        for color in CELL_COLORS:
+            tile = pygame.Surface((CELL_SIZE, CELL_SIZE))
+            tile.fill(pygame.Color(color))
+            self.tiles.append(tile)
+        self.running = True
+
+        self.occupancy = np.zeros((BOARD_SIZE, BOARD_SIZE), dtype=bool)
+        self.shots = np.full((BOARD_SIZE, BOARD_SIZE), WATER, dtype=np.int8)
+        self.num_shots = 0
+        self._drawn = np.full((BOARD_SIZE, BOARD_SIZE), -1, dtype=np.int8)
+        self._draw_background()
+
+    def _draw_background(self) -> None:
+        self.screen.fill(pygame.Color("white"))
+        for i in range(BOARD_SIZE):
+            label = self.font.render(str(i), True, pygame.Color("black"))
+            offset = MARGIN + i * (CELL_SIZE + MARGIN) + CELL_SIZE // 2
+            # column numbers above the grid, row numbers left of it
+            self.screen.blit(label, label.get_rect(center=(offset, MARGIN // 2)))
+            self.screen.blit(label, label.get_rect(center=(MARGIN // 2, offset)))
+        pygame.display.flip()
+
+    def set_occupancy(self, occupancy) -> None:
+        """Sets the fleet, as a boolean grid indexed by [x, y]."""
+        self.occupancy = occupancy
+
+    def shoot(self, x, y, hit) -> None:
+        self.shots[x, y] = HIT if hit else MISS
+        self.num_shots += 1
+
+    def set_history(self, history) -> None:
+        """Applies the shots of `history` not seen yet; starts over if it is
+        not a continuation of the previous history."""
+        if len(history) < self.num_shots:
+            self.shots[:] = WATER
+            self.num_shots = 0
+        for a, o in history[self.num_shots :]:
+            self.shoot(a.coord.x, a.coord.y, o.name == "hit")
+
+    def draw(self) -> None:
+        """Redraws the cells that changed since the last call."""
+        cells = np.where(self.shots != WATER, self.shots, self.occupancy * SHIP)
+        rects = []
+        for x, y in np.argwhere(cells != self._drawn):
+            rect = cell_rect(x, y)
+            self.screen.blit(self.tiles[cells[x, y]], rect)
+            rects.append(rect)
+        self._drawn = cells.astype(np.int8)
+        if rects:
+            pygame.display.update(rects)
+
+    def handle_events(self) -> bool:
+        """Processes window events; returns False once the window is closed."""
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.running = False
+        return self.running
+
+    def close(self) -> None:
+        pygame.quit()
+
+
+class RenderProcess:
+    """
+    Runs a `BoardRenderer` in a separate process. The methods only put messages
+    on a queue, so they return immediately.
+
+    Args:
+        fps (int): maximum frame rate of the window. Default: 30.
+    """
+
+    def __init__(self, fps=30) -> None:
+        self._queue = multiprocessing.Queue()
+        self._process = multiprocessing.Process(
+            target=_render_main, args=(self._queue, fps), daemon=True
+        )
+        self._process.start()
+
+    def set_state(self, state: State_Battleship) -> None:
+        self._queue.put(("state", state.occupancy()))
+
+    def shot(self, action, observation) -> None:
+        self._queue.put(
+            ("shot", action.coord.x, action.coord.y, observation.name == "hit")
+        )
+
+    @property
+    def running(self) -> bool:
+        """False once the window has been closed."""
+        return self._process.is_alive()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._process.join(timeout=1.0)
+
+
+def _render_main(queue, fps) -> None:
+    board = BoardRenderer()
+    clock = pygame.time.Clock()
+    try:
+        while board.handle_events():
+            while True:
+                try:
+                    message = queue.get_nowait()
+                except Empty:
+                    break
+                if message is None:
+                    return
+                if message[0] == "state":
+                    board.set_occupancy(message[1])
+                else:
+                    board.shoot(*message[1:])
+            board.draw()
+            clock.tick(fps)
+    finally:
+        board.close()
+
+
+_board = None
+
+
+def render(state: State_Battleship, history: list) -> None:
+    """Draws `state` and `history` in this process's window."""
+    global _board
+    if _board is None:
+        _board = BoardRenderer()
+    _board.set_occupancy(state.occupancy())
+    _board.set_history(history)
+    _board.draw()
+
+
+def handle_events(state: State_Battleship) -> None:
+    if _board is not None:
+        state.running = _board.handle_events()
+
+
+def quit() -> None:
+    global _board
+    if _board is not None:
+        _board.close()
+        _board = None
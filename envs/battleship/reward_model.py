@@ -3,6 +3,7 @@ from envs.battleship.types import (
     State_Battleship,
     Observation_Battleship,
 )
+import numpy as np
 
 
 class RewardModel_Battleship:
@@ -24,3 +25,35 @@ class RewardModel_Battleship:
                 return 100
             else:
                 return -1
+
+    def sample_batch(
+        self, states, actions, history, next_states, histories=None
+    ) -> np.ndarray:
+        """`histories`, if given, holds one history per item and replaces `history`."""
+        grids = np.stack([s.occupancy() for s in states])
+        n_occupied = np.fromiter(
+            (sum(ship.length for ship in s.ships) for s in states), dtype=np.intp
+        )
+
+        if histories is None:
+            histories = [history] * len(grids)
+        boards = {}  # cells fired at in each distinct history
+        for h in histories:
+            if id(h) not in boards:
+                board = np.zeros(grids.shape[1:], dtype=bool)
+                for a, _ in h:
+                    board[a.coord.x, a.coord.y] = True
+                boards[id(h)] = board
+        fired = np.stack([boards[id(h)] for h in histories])
+        n_fired = np.fromiter((len(h) for h in histories), dtype=np.intp)
+        xs = np.fromiter((a.coord.x for a in actions), dtype=np.intp)
+        ys = np.fromiter((a.coord.y for a in actions), dtype=np.intp)
+        fired[np.arange(len(grids)), xs, ys] = True
+
+        sunk = ~np.any(grids & ~fired, axis=(1, 2))
+        sunk &= n_occupied <= n_fired + 1
+        # cells off the board can never be fired at
+        sunk &= np.fromiter(
+            (all(ship._is_valid() for ship in s.ships) for s in states), dtype=bool
+        )
+        return np.where(sunk, 100.0, -1.0)
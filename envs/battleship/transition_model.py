@@ -1,4 +1,5 @@
 from envs.battleship.types import State_Battleship, Action_Battleship
+import numpy as np
 
 
 class TransitionModel_Battleship:
@@ -12,3 +13,8 @@ class TransitionModel_Battleship:
 
     def sample(self, state, action) -> State_Battleship:
         return state
+
+    def sample_batch(self, states, actions) -> np.ndarray:
+        next_states = np.empty(len(states), dtype=object)
+        next_states[:] = list(states)
+        return next_states
@@ -1,16 +1,11 @@
 from enum import Enum
-import random
-import pygame
+from rng import default_rng
 import copy
 import numpy as np
 
-CELL_SIZE = 40
-MARGIN = 10
 BOARD_SIZE = 10
-WINDOW_SIZE = (
-    BOARD_SIZE * (CELL_SIZE + MARGIN) + MARGIN,
-    BOARD_SIZE * (CELL_SIZE + MARGIN) + MARGIN,
-)
+PLACEMENT_BITS = 12  # x: 4, y: 4, vertical: 1, length: 3
+MAX_MOVE_TRIES = 100  # draws per `_ship_*` move before it gives up
 
 
 class Coord:
@@ -82,13 +77,17 @@ class Ship:
         coord: Coord | None = None,
         direction: Coord | None = None,
         length: int | None = None,
+        rng=None,
     ):
+        """Missing fields are drawn from `rng` (default: `default_rng()`)."""
+        if rng is None:
+            rng = default_rng()
         if coord is None:
-            coord = Coord(random.randint(0, 9), random.randint(0, 9))
+            coord = Coord(rng.randint(0, 9), rng.randint(0, 9))
         if direction is None:
-            direction = Compass.get_coord(random.randint(0, 3))
+            direction = Compass.get_coord(rng.randint(0, 3))
         if length is None:
-            length = random.randint(1, 5)
+            length = rng.randint(1, 5)
 
         self.pos = coord
         self.direction = direction
@@ -107,22 +106,66 @@ class Ship:
             ]
         )
 
+    def placement(self) -> tuple:
+        """(length, x, y, vertical) of the cells the ship occupies: ships pointing
+        West or South are described from their other end, pointing East or North."""
+        pos, direction = self.pos, self.direction
+        if direction.x + direction.y < 0:
+            pos = pos + (self.length - 1) * direction
+            direction = -1 * direction
+        vertical = self.length > 1 and direction.y != 0
+        return (self.length, pos.x, pos.y, int(vertical))
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Ship) and self.placement() == other.placement()
+
     def __hash__(self) -> int:
-        return hash((self.pos, self.direction, self.length))
+        return hash(self.placement())
+
+
+def pack_placement(placement) -> int | None:
+    """Packs a `Ship.placement` into PLACEMENT_BITS bits, or None if out of range."""
+    length, x, y, vertical = placement
+    if not (0 <= x < 16 and 0 <= y < 16 and 0 < length < 8):
+        return None
+    return (x << 8) | (y << 4) | (vertical << 3) | length
 
 
 class State_Battleship:
     def __init__(self, ships: list[Ship]) -> None:
         self.ships = ships
+        self._occupancy = None
+        self._key = None
 
     def __repr__(self):
         return f"State_Battleship(ships={self.ships})"
 
+    def __deepcopy__(self, memo):
+        # derived caches are not copied, so that copies can be mutated freely
+        return State_Battleship(copy.deepcopy(self.ships, memo))
+
     def __eq__(self, other):
-        return isinstance(other, State_Battleship) and self.ships == other.ships
+        return isinstance(other, State_Battleship) and self.key() == other.key()
 
     def __hash__(self):
-        return hash(tuple(self.ships))
+        return hash(self.key())
+
+    def key(self) -> int | tuple:
+        """Canonical key of the fleet, computed once per state: the packed placements
+        of the ships sorted by length, so that fleets occupying the same cells with
+        the same ships share a key whatever the order or direction of the ships.
+        Falls back to a tuple of placements for ships off the packable range."""
+        if self._key is None:
+            placements = sorted(ship.placement() for ship in self.ships)
+            key = 1  # leading bit, so that the number of ships is part of the key
+            for placement in placements:
+                packed = pack_placement(placement)
+                if packed is None:
+                    key = tuple(placements)
+                    break
+                key = (key << PLACEMENT_BITS) | packed
+            self._key = key
+        return self._key
 
     def is_occupied(self, coord) -> bool:
         for ship in self.ships:
@@ -131,6 +174,16 @@ class State_Battleship:
                     return True
         return False
 
+    def occupancy(self) -> np.ndarray:
+        """Boolean grid indexed by [x, y], computed once per state."""
+        if self._occupancy is None:
+            grid = np.zeros((BOARD_SIZE, BOARD_SIZE), dtype=bool)
+            for coord in self.get_all_occupied():
+                if coord._is_valid():
+                    grid[coord.x, coord.y] = True
+            self._occupancy = grid
+        return self._occupancy
+
     def get_all_occupied(self) -> list[Coord]:
         coords = []
         for ship in self.ships:
@@ -140,7 +193,7 @@ class State_Battleship:
     def ship_adjacent(self, ship) -> bool:
         for coord in get_occupation_coords(ship.pos, ship.direction, ship.length):
             for other_ship in self.ships:
-                if other_ship == ship:
+                if other_ship is ship:
                     continue
 
                 for ship_coord in get_occupation_coords(
@@ -171,12 +224,17 @@ class State_Battleship:
                 return False
         return True
 
-    def _ship_swap(self) -> "State_Battleship":
+    def _ship_swap(
+        self, rng=None, max_tries=MAX_MOVE_TRIES
+    ) -> "State_Battleship | None":
         """
-        2 ships of different sizes swapped location
+        2 ships of different sizes swapped location;
+        None if no valid swap was drawn in `max_tries` tries
         """
-        while True:
-            i, j = np.random.choice(len(self.ships), 2, replace=False)
+        if rng is None:
+            rng = default_rng()
+        for _ in range(max_tries):
+            i, j = rng.sample(range(len(self.ships)), 2)
             i, j = sorted((i, j))
             if all(
                 [
@@ -264,9 +322,15 @@ class State_Battleship:
                         self.ships[j].direction,
                     )
                     return new_state
+        return None
 
-    def _ship_merge(self) -> list["State_Battleship"]:
-        """2 smaller ships were swapped into the location of 1 larger ship"""
+    def _ship_merge(
+        self, rng=None, max_tries=MAX_MOVE_TRIES
+    ) -> list["State_Battleship"] | None:
+        """2 smaller ships were swapped into the location of 1 larger ship;
+        None if no such triplet was drawn in `max_tries` tries"""
+        if rng is None:
+            rng = default_rng()
 
         def triplet_merge(i, j, k) -> list["State_Battleship"]:
             new_state = copy.deepcopy(self)
@@ -308,130 +372,78 @@ class State_Battleship:
                 new_state.ships[k].direction = self.ships[j].direction
                 outputs.append(new_state)
 
-            random_coord = Coord(
-                random.randint(0, 9),
-                random.randint(0, 9),
-            )
-            random_direction = Compass.get_coord(random.randint(0, 3))
-
-            while not all(
-                [
-                    coord._is_valid()
-                    for coord in get_occupation_coords(
-                        random_coord, random_direction, len_k
-                    )
-                ]
-            ):
+            for _ in range(max_tries):
                 random_coord = Coord(
-                    random.randint(0, 9),
-                    random.randint(0, 9),
+                    rng.randint(0, 9),
+                    rng.randint(0, 9),
                 )
-                random_direction = Compass.get_coord(random.randint(0, 3))
-
-            new_state.ships[k].pos = random_coord
-            new_state.ships[k].direction = random_direction
-            outputs.append(new_state)
+                random_direction = Compass.get_coord(rng.randint(0, 3))
+                if all(
+                    [
+                        coord._is_valid()
+                        for coord in get_occupation_coords(
+                            random_coord, random_direction, len_k
+                        )
+                    ]
+                ):
+                    new_state.ships[k].pos = random_coord
+                    new_state.ships[k].direction = random_direction
+                    outputs.append(new_state)
+                    break
 
             return outputs
 
-        while True:
-            i, j, k = np.random.choice(len(self.ships), 3, replace=False)
+        for _ in range(max_tries):
+            i, j, k = rng.sample(range(len(self.ships)), 3)
             if self.ships[i].length + self.ships[j].length < self.ships[k].length:
                 return triplet_merge(i, j, k)
-
-    def _ship_move(self) -> "State_Battleship":
-        """1 to 4 ships were moved to a new location, selected uniformly at random, and accepted if the new configuration was legal"""
-        while True:
-            i, j, k, l = np.random.choice(len(self.ships), 4, replace=False)
+        return None
+
+    def _ship_move(
+        self, rng=None, max_tries=MAX_MOVE_TRIES
+    ) -> "State_Battleship | None":
+        """1 to 4 ships were moved to a new location, selected uniformly at random, and accepted if the new configuration was legal;
+        None if no legal configuration was drawn in `max_tries` tries"""
+        if rng is None:
+            rng = default_rng()
+        for _ in range(max_tries):
+            i, j, k, l = rng.sample(range(len(self.ships)), 4)
             new_state = copy.deepcopy(self)
-            new_state.ships[i].pos = Coord(random.randint(0, 9), random.randint(0, 9))
-            new_state.ships[j].pos = Coord(random.randint(0, 9), random.randint(0, 9))
-            new_state.ships[k].pos = Coord(random.randint(0, 9), random.randint(0, 9))
-            new_state.ships[l].pos = Coord(random.randint(0, 9), random.randint(0, 9))
+            new_state.ships[i].pos = Coord(rng.randint(0, 9), rng.randint(0, 9))
+            new_state.ships[j].pos = Coord(rng.randint(0, 9), rng.randint(0, 9))
+            new_state.ships[k].pos = Coord(rng.randint(0, 9), rng.randint(0, 9))
+            new_state.ships[l].pos = Coord(rng.randint(0, 9), rng.randint(0, 9))
             if new_state._is_valid():
                 return new_state
+        return None
 
-    def init_window(self) -> None:
-        pygame.init()
-        self.screen = pygame.display.set_mode(WINDOW_SIZE)
-        pygame.display.set_caption("Battleship")
-        self.clock = pygame.time.Clock()
-        self.running = True
+    # rendering lives in envs.battleship.render, imported only when used, so that
+    # headless processes never import pygame
 
     def render(self, history: list):
-        if not hasattr(self, "screen"):
-            self.init_window()
-
-        hits = {a.coord for a, o in history if o.name == "hit"}
-        misses = {a.coord for a, o in history if o.name == "miss"}
-
-        self.screen.fill(pygame.Color("white"))
-
-        font = pygame.font.SysFont(
-            None, 24
-        )  # Choose a font and size appropriate for your cell size
-
-        # Draw column numbers
-        for x in range(BOARD_SIZE):
-            num_surf = font.render(str(x), True, pygame.Color("black"))
-            num_rect = num_surf.get_rect(
-                center=(
-                    MARGIN + x * (CELL_SIZE + MARGIN) + CELL_SIZE // 2,
-                    MARGIN // 2,  # half margin above grid
-                )
-            )
-            self.screen.blit(num_surf, num_rect)
-
-        # Draw row numbers
-        for y in range(BOARD_SIZE):
-            num_surf = font.render(str(y), True, pygame.Color("black"))
-            num_rect = num_surf.get_rect(
-                center=(
-                    MARGIN // 2,  # half margin to left of grid
-                    MARGIN + y * (CELL_SIZE + MARGIN) + CELL_SIZE // 2,
-                )
-            )
-            self.screen.blit(num_surf, num_rect)
-
-        for y in range(BOARD_SIZE):
-            for x in range(BOARD_SIZE):
-                rect = pygame.Rect(
-                    MARGIN + x * (CELL_SIZE + MARGIN),
-                    MARGIN + y * (CELL_SIZE + MARGIN),
-                    CELL_SIZE,
-                    CELL_SIZE,
-                )
-                coord = Coord(x, y)
+        from envs.battleship import render
 
-                color = pygame.Color("lightblue")
-                if self.is_occupied(coord):
-                    color = pygame.Color("gray")
-                if coord in misses:
-                    color = pygame.Color("blue")
-                elif coord in hits:
-                    color = pygame.Color("red")
-
-                pygame.draw.rect(self.screen, color, rect)
-
-        pygame.display.flip()
+        render.render(self, history)
 
     def handle_events(self):
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                self.running = False
+        from envs.battleship import render
+
+        render.handle_events(self)
 
     def quit(self):
-        pygame.quit()
+        from envs.battleship import render
+
+        render.quit()
 
 
-def generate_random_state() -> State_Battleship:
+def generate_random_state(rng=None) -> State_Battleship:
     state = State_Battleship([])
 
     for length in [5, 4, 3, 2, 2]:
-        ship = Ship(length=length)
+        ship = Ship(length=length, rng=rng)
 
         while not ship._is_valid() or state.ship_adjacent(ship):
-            ship = Ship(length=length)
+            ship = Ship(length=length, rng=rng)
 
         state.ships.append(ship)
 
@@ -1,37 +1,68 @@
 from envs.tiger.types import Observation_Tiger
-import random
+from rng import default_rng
+import numpy as np
 
 
 class ObservationModel_Tiger:
-    def __init__(self, n: int, noise=0.1):
+    def __init__(self, n: int, noise=0.1, rng=None):
         self.noise = noise
         self.n = n
+        self.rng = rng if rng is not None else default_rng()
+        self._observations = None
 
     def probability(self, observation, next_state, action) -> float:
-        if action.name == "listen":
+        if action.is_listen:
             # heard the correct growl
-            if observation.name == next_state.name:
+            if observation.index == next_state.index:
                 return 1.0 - self.noise
             else:
                 return self.noise / (self.n - 1)
         else:
             return 1 / self.n
 
+    def support(self, next_state, action) -> list[tuple[Observation_Tiger, float]]:
+        """The (observation, probability) pairs of non-zero probability"""
+        observations = self.get_all_observations()
+        if not action.is_listen:
+            return [(observation, 1 / self.n) for observation in observations]
+        noise = self.noise / (self.n - 1)
+        return [
+            (observation, 1.0 - self.noise if i == next_state.index else noise)
+            for i, observation in enumerate(observations)
+            if i == next_state.index or noise > 0
+        ]
+
     def sample(self, next_state, action) -> Observation_Tiger:
-        if action.name == "listen":
+        if action.is_listen:
             thresh = 1.0 - self.noise
         else:
             thresh = 1 / self.n
 
-        if random.uniform(0, 1) < thresh:
-            return Observation_Tiger(next_state.name, self.n)
+        if self.rng.random() < thresh:
+            return Observation_Tiger.from_index(next_state.index, self.n)
         else:
-            return random.choice(
-                [o for o in self.get_all_observations() if o.name != next_state.name]
-            )
+            # uniform over the n - 1 other doors
+            index = self.rng.randrange(self.n - 1)
+            if index >= next_state.index:
+                index += 1
+            return Observation_Tiger.from_index(index, self.n)
+
+    def sample_batch(self, next_states, actions) -> np.ndarray:
+        if self._observations is None:
+            self._observations = np.empty(self.n, dtype=object)
+            self._observations[:] = self.get_all_observations()
+        indices = np.fromiter((s.index for s in next_states), dtype=np.intp)
+        listen = np.fromiter((a.is_listen for a in actions), dtype=bool)
+        thresh = np.where(listen, 1.0 - self.noise, 1 / self.n)
+
+        generator = self.rng.generator
+        noisy = generator.integers(self.n - 1, size=len(indices))
+        noisy += noisy >= indices
+        correct = generator.random(len(indices)) < thresh
+        return self._observations[np.where(correct, indices, noisy)]
 
     def get_all_observations(self):
         """Only need to implement this if you're using
         a solver that needs to enumerate over the observation
         space (e.g. value iteration)"""
-        return [Observation_Tiger(f"tiger-{s}", self.n) for s in range(self.n)]
+        return [Observation_Tiger.from_index(s, self.n) for s in range(self.n)]
@@ -1,19 +1,19 @@
 from envs.tiger.types import State_Tiger, Action_Tiger
-import random
+from rng import default_rng
 
 
 class PolicyModel_Tiger:
-    def __init__(self, n: int):
+    def __init__(self, n: int, rng=None):
         self.n = n
+        self.rng = rng if rng is not None else default_rng()
+        self._all_actions = [Action_Tiger.from_index(i, n) for i in range(n + 1)]
 
     def sample(self, state):
-        return random.sample(self.get_all_actions(), 1)[0]
+        return self.rng.choice(self._all_actions)
 
     def rollout(self, state, *args) -> State_Tiger:
         return self.sample(state)
 
     def get_all_actions(self, state=None, history=None) -> list[Action_Tiger]:
-        return [
-            Action_Tiger(s, self.n)
-            for s in [f"open-{s}" for s in range(self.n)] + ["listen"]
-        ]
+        """The returned list is shared; do not modify it."""
+        return self._all_actions
@@ -0,0 +1,63 @@
+from envs.tiger.types import State_Tiger, Action_Tiger, Observation_Tiger
+from rng import default_rng
+
+
+class PosteriorKernel_Tiger:
+    """Reinvigoration kernel of Tiger, usable as a `state_transform_func`.
+
+    Ignores the particle it is given and draws a state from the initial belief
+    weighted by the likelihood of the observations of the history, i.e. from the
+    exact posterior. Opening a door puts the tiger behind a uniformly random door,
+    so after an open action the prior is uniform and only the later observations
+    count.
+
+    Args:
+        init_belief (Particles): the agent's initial belief.
+        observation_model (ObservationModel_Tiger): model of the observations.
+        rng (RNG): random stream of the draws when the call passes none.
+            Default: `default_rng()`.
+    """
+
+    def __init__(self, init_belief, observation_model, rng=None) -> None:
+        self.n = observation_model.n
+        self.observation_model = observation_model
+        self.states = [State_Tiger.from_index(i, self.n) for i in range(self.n)]
+        histogram = init_belief.get_histogram()
+        self.prior = [histogram[state] for state in self.states]
+        self.rng = rng if rng is not None else default_rng()
+        self._history = None
+        self._weights = None
+
+    def weights(
+        self, history: list[tuple[Action_Tiger, Observation_Tiger]]
+    ) -> list[float]:
+        """Unnormalized posterior of each door after `history`; the last one
+        is cached."""
+        history = tuple(history)
+        if history == self._history:
+            return self._weights
+        weights = list(self.prior)
+        for action, observation in history:
+            if not action.is_listen:
+                weights = [1.0] * self.n
+            weights = [
+                weight * self.observation_model.probability(observation, state, action)
+                for weight, state in zip(weights, self.states)
+            ]
+        self._history, self._weights = history, weights
+        return weights
+
+    def __call__(
+        self,
+        state: State_Tiger,
+        history: list[tuple[Action_Tiger, Observation_Tiger]],
+        rng=None,
+    ) -> State_Tiger:
+        """One particle drawn from the posterior; draws from `rng` if given,
+        else `self.rng`. Returns `state` if the history has zero likelihood."""
+        if rng is None:
+            rng = self.rng
+        weights = self.weights(history)
+        if sum(weights) <= 0:
+            return state
+        return rng.choices(self.states, weights)
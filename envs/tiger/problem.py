@@ -1,5 +1,6 @@
 from envs.tiger.types import *
 from agent import Agent, Environment
+from generator import BeliefTensors
 from envs.tiger.observation_model import ObservationModel_Tiger
 from envs.tiger.transition_model import TransitionModel_Tiger
 from envs.tiger.reward_model import RewardModel_Tiger
@@ -8,17 +9,35 @@ from envs.tiger.policy_model import PolicyModel_Tiger
 
 class Problem_Tiger:
     def __init__(
-        self, n: int, obs_noise: float, init_true_state: State_Tiger, init_belief
+        self,
+        n: int,
+        obs_noise: float,
+        init_true_state: State_Tiger,
+        init_belief,
+        rng=None,
     ) -> None:
         self.agent = Agent(
             init_belief,
-            policy_model=PolicyModel_Tiger(n),
-            transition_model=TransitionModel_Tiger(n),
+            policy_model=PolicyModel_Tiger(n, rng),
+            transition_model=TransitionModel_Tiger(n, rng),
             reward_model=RewardModel_Tiger(),
-            observation_model=ObservationModel_Tiger(n, obs_noise),
+            observation_model=ObservationModel_Tiger(n, obs_noise, rng),
         )
         self.env = Environment(
             init_true_state,
-            transition_model=TransitionModel_Tiger(n),
+            transition_model=TransitionModel_Tiger(n, rng),
             reward_model=RewardModel_Tiger(),
         )
+
+    def belief_tensors(self, sparse=False) -> BeliefTensors:
+        """Exact matrix-form belief updater; all the open actions share
+        the same transition and observation tensors."""
+        return BeliefTensors(
+            self.agent.transition_model.get_all_states(),
+            self.agent.policy_model.get_all_actions(),
+            self.agent.observation_model.get_all_observations(),
+            self.agent.transition_model,
+            self.agent.observation_model,
+            action_key=lambda action: action.is_listen,
+            sparse=sparse,
+        )
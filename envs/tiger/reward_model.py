@@ -1,4 +1,5 @@
 from envs.tiger.types import Action_Tiger, State_Tiger, Observation_Tiger
+import numpy as np
 
 
 class RewardModel_Tiger:
@@ -9,10 +10,20 @@ class RewardModel_Tiger:
         history: list[tuple[Action_Tiger, Observation_Tiger]],
         next_state: State_Tiger,
     ) -> float:
-        if action.name == "listen":
+        if action.is_listen:
             return -1
         else:
-            if state.name.split("-")[1] != action.name.split("-")[1]:
+            if state.index != action.index:
                 return 10
             else:
                 return -100
+
+    def sample_batch(
+        self, states, actions, history, next_states, histories=None
+    ) -> np.ndarray:
+        state_indices = np.fromiter((s.index for s in states), dtype=np.intp)
+        action_indices = np.fromiter((a.index for a in actions), dtype=np.intp)
+        listen = np.fromiter((a.is_listen for a in actions), dtype=bool)
+        return np.where(
+            listen, -1.0, np.where(state_indices != action_indices, 10.0, -100.0)
+        )
@@ -1,27 +1,45 @@
 from envs.tiger.types import State_Tiger, Action_Tiger
-import random
+from rng import default_rng
+import numpy as np
 
 
 class TransitionModel_Tiger:
-    def __init__(self, n: int):
+    def __init__(self, n: int, rng=None):
         self.n = n
+        self.rng = rng if rng is not None else default_rng()
+        self._states = None
 
     def probability(
         self, next_state: State_Tiger, state: State_Tiger, action: Action_Tiger
     ) -> float:
-        if action.name.startswith("open"):
+        if not action.is_listen:
             return 1 / self.n
         else:
-            if next_state.name == state.name:
+            if next_state.index == state.index:
                 return 1.0
             else:
                 return 0
 
+    def support(self, state, action) -> list[tuple[State_Tiger, float]]:
+        """The (next state, probability) pairs of non-zero probability"""
+        if action.is_listen:
+            return [(state, 1.0)]
+        return [(next_state, 1 / self.n) for next_state in self.get_all_states()]
+
     def sample(self, state, action) -> State_Tiger:
-        if action.name.startswith("open"):
-            return random.choice(self.get_all_states())
+        if not action.is_listen:
+            return State_Tiger.from_index(self.rng.randrange(self.n), self.n)
         else:
             return state
 
+    def sample_batch(self, states, actions) -> np.ndarray:
+        if self._states is None:
+            self._states = np.empty(self.n, dtype=object)
+            self._states[:] = self.get_all_states()
+        indices = np.fromiter((s.index for s in states), dtype=np.intp)
+        listen = np.fromiter((a.is_listen for a in actions), dtype=bool)
+        reset = self.rng.generator.integers(self.n, size=len(indices))
+        return self._states[np.where(listen, indices, reset)]
+
     def get_all_states(self):
-        return [State_Tiger(f"tiger-{s}", self.n) for s in range(self.n)]
+        return [State_Tiger.from_index(s, self.n) for s in range(self.n)]
@@ -1,49 +1,100 @@
+def _parse_index(name: str, prefix: str, n: int) -> int:
+    """Returns the integer suffix of `name`, or -1 if `name` is not
+    `prefix` followed by an index in [0, n)."""
+    digits = name[len(prefix) :]
+    if not name.startswith(prefix) or not digits.isdecimal():
+        return -1
+    index = int(digits)
+    if index >= n or str(index) != digits:
+        return -1
+    return index
+
+
 class State_Tiger:
+    _interned = {}
+
     def __init__(self, name: str, n: int):
         self.name = name
         self.n = n
-        if name not in [f"tiger-{s}" for s in range(self.n)]:
+        self.index = _parse_index(name, "tiger-", n)
+        if self.index < 0:
             raise ValueError("Invalid state: %s" % name)
 
+    @classmethod
+    def from_index(cls, index: int, n: int) -> "State_Tiger":
+        """Returns the interned state for the tiger behind door `index`"""
+        key = (index, n)
+        if key not in cls._interned:
+            cls._interned[key] = cls(f"tiger-{index}", n)
+        return cls._interned[key]
+
     def __repr__(self):
         return f"State_{self.n}-Tiger({self.name})"  # self.name
 
     def __eq__(self, other):
-        return self.name == other.name and type(self) == type(other)
+        return type(self) == type(other) and self.index == other.index
 
     def __hash__(self):
-        return hash(self.name)
+        return self.index
 
 
 class Action_Tiger:
+    """Opening door i has index i, listening has index n."""
+
+    _interned = {}
+
     def __init__(self, name: str, n: int):
         self.name = name
         self.n = n
-        if name not in [f"open-{s}" for s in range(self.n)] + ["listen"]:
-            raise ValueError("Invalid action: %s" % name)
+        if name == "listen":
+            self.index = n
+        else:
+            self.index = _parse_index(name, "open-", n)
+            if self.index < 0:
+                raise ValueError("Invalid action: %s" % name)
+        self.is_listen = self.index == n
+
+    @classmethod
+    def from_index(cls, index: int, n: int) -> "Action_Tiger":
+        """Returns the interned action with index `index`"""
+        key = (index, n)
+        if key not in cls._interned:
+            cls._interned[key] = cls("listen" if index == n else f"open-{index}", n)
+        return cls._interned[key]
 
     def __repr__(self):
         return f"Act_{self.n}-Tiger({self.name})"  # self.name
 
     def __eq__(self, other):
-        return self.name == other.name and type(self) == type(other)
+        return type(self) == type(other) and self.index == other.index
 
     def __hash__(self):
-        return hash(self.name)
+        return self.index
 
 
 class Observation_Tiger:
+    _interned = {}
+
     def __init__(self, name: str, n: int):
         self.name = name
         self.n = n
-        if name not in [f"tiger-{s}" for s in range(self.n)]:
+        self.index = _parse_index(name, "tiger-", n)
+        if self.index < 0:
             raise ValueError("Invalid action: %s" % name)
 
+    @classmethod
+    def from_index(cls, index: int, n: int) -> "Observation_Tiger":
+        """Returns the interned observation of a growl behind door `index`"""
+        key = (index, n)
+        if key not in cls._interned:
+            cls._interned[key] = cls(f"tiger-{index}", n)
+        return cls._interned[key]
+
     def __repr__(self):
         return f"Obs_{self.n}-Tiger({self.name})"  # self.name
 
     def __eq__(self, other):
-        return self.name == other.name and type(self) == type(other)
+        return type(self) == type(other) and self.index == other.index
 
     def __hash__(self):
-        return hash(self.name)
+        return self.index
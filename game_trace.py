@@ -0,0 +1,311 @@
+"""Game traces: one JSON object per line, optionally gzip-compressed (.gz).
+
+The first line is a header, then one line per step:
+
+    {"type": "header", "version": 1, "domain": "battleship", "params": {},
+     "true_state": ..., "planner": {...}}
+    {"type": "step", "step": 0, "action": ..., "observation": ..., "reward": -1,
+     "true_state": ..., "root": [[action, visits, value], ...],
+     "belief": {"particles": 1000, "distinct": 812, ...}, "planning_time": 0.5}
+
+States, actions and observations are stored in the compact form of the domain's
+codec (`CODECS`). Traces are read lazily with `TraceReader`, replayed with
+`replay` and summarized with `summarize`:
+
+    python game_trace.py summary trace.jsonl.gz
+    python game_trace.py replay trace.jsonl.gz [--gui]
+"""
+
+import argparse
+import gzip
+import json
+import math
+import time
+
+import numpy as np
+
+from envs.battleship.types import Action_Battleship, Observation_Battleship, Coord
+from envs.battleship.encoding import encode_state, decode_state
+from envs.tiger.types import State_Tiger, Action_Tiger, Observation_Tiger
+
+TRACE_VERSION = 1
+
+
+class BattleshipCodec:
+    """States as (x, y, direction, length) rows, actions as [x, y] and
+    observations as "hit"/"miss"; beliefs summarized by the per-mille
+    probability of each cell to be occupied."""
+
+    def encode_state(self, state):
+        return encode_state(state).tolist()
+
+    def decode_state(self, data):
+        return decode_state(data)
+
+    def encode_action(self, action):
+        return [action.coord.x, action.coord.y]
+
+    def decode_action(self, data):
+        return Action_Battleship(Coord(*data))
+
+    def encode_observation(self, observation):
+        return observation.name
+
+    def decode_observation(self, data):
+        return Observation_Battleship(data)
+
+    def belief_summary(self, particles) -> dict:
+        occupancy = np.mean([s.occupancy() for s in particles], axis=0)
+        return {"occupancy": np.rint(1000 * occupancy).astype(int).tolist()}
+
+
+class TigerCodec:
+    """States, actions and observations as their index."""
+
+    def __init__(self, n=2) -> None:
+        self.n = n
+
+    def encode_state(self, state):
+        return state.index
+
+    def decode_state(self, data):
+        return State_Tiger.from_index(data, self.n)
+
+    def encode_action(self, action):
+        return action.index
+
+    def decode_action(self, data):
+        return Action_Tiger.from_index(data, self.n)
+
+    def encode_observation(self, observation):
+        return observation.index
+
+    def decode_observation(self, data):
+        return Observation_Tiger.from_index(data, self.n)
+
+    def belief_summary(self, particles) -> dict:
+        counts = np.bincount([s.index for s in particles], minlength=self.n)
+        return {"doors": (counts / max(counts.sum(), 1)).round(3).tolist()}
+
+
+CODECS = {
+    "battleship": BattleshipCodec,
+    "tiger": TigerCodec,
+}
+
+
+def _open(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t")
+    return open(path, mode)
+
+
+def _dumps(record) -> str:
+    return json.dumps(record, separators=(",", ":"))
+
+
+class TraceWriter:
+    """
+    Records a game to `path`, one line per step.
+
+    Args:
+        path (str): trace file; gzip-compressed if it ends with ".gz".
+        domain (str): key of the domain's codec in `CODECS`.
+        true_state: the initial true state.
+        planner_config (dict): recorded in the header. Default: None.
+        params (dict): keyword arguments of the codec (e.g. {"n": 3} for Tiger).
+            Default: None.
+    """
+
+    def __init__(
+        self, path, domain, true_state, planner_config=None, params=None
+    ) -> None:
+        self.codec = CODECS[domain](**(params or {}))
+        self._file = _open(path, "w")
+        self._num_steps = 0
+        self._write(
+            {
+                "type": "header",
+                "version": TRACE_VERSION,
+                "domain": domain,
+                "params": params or {},
+                "true_state": self.codec.encode_state(true_state),
+                "planner": planner_config or {},
+            }
+        )
+
+    def _write(self, record) -> None:
+        self._file.write(_dumps(record) + "\n")
+
+    def step(
+        self,
+        action,
+        observation,
+        reward,
+        true_state=None,
+        tree=None,
+        belief=None,
+        planning_time=None,
+    ) -> None:
+        """Records one step. `tree` is the planner's root (before `update`) and
+        `belief` the particles it planned from; both are summarized."""
+        codec = self.codec
+        record = {
+            "type": "step",
+            "step": self._num_steps,
+            "action": codec.encode_action(action),
+            "observation": codec.encode_observation(observation),
+            "reward": reward,
+        }
+        if true_state is not None:
+            record["true_state"] = codec.encode_state(true_state)
+        if tree is not None:
+            record["root"] = [
+                [
+                    codec.encode_action(a),
+                    tree[a].num_visits,
+                    round(tree[a].value, 4),
+                ]
+                for a in tree.children
+            ]
+        if belief is not None:
+            record["belief"] = self._belief_summary(belief)
+        if planning_time is not None:
+            record["planning_time"] = round(planning_time, 6)
+        self._write(record)
+        self._num_steps += 1
+
+    def _belief_summary(self, belief) -> dict:
+        particles = list(belief)
+        counts = {}
+        for s in particles:
+            counts[s] = counts.get(s, 0) + 1
+        entropy = -sum(
+            c / len(particles) * math.log(c / len(particles)) for c in counts.values()
+        )
+        summary = {
+            "particles": len(particles),
+            "distinct": len(counts),
+            "entropy": round(entropy, 4),
+        }
+        if particles:
+            summary.update(self.codec.belief_summary(particles))
+        return summary
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "TraceWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class TraceReader:
+    """
+    Streams a trace written by `TraceWriter`: the header is read on creation,
+    and the steps one at a time while iterating, with states, actions and
+    observations decoded (`decode=False` keeps the stored form).
+    """
+
+    def __init__(self, path, decode=True) -> None:
+        self.path = path
+        self.decode = decode
+        with _open(path, "r") as f:
+            self.header = json.loads(f.readline())
+        if self.header.get("type") != "header":
+            raise ValueError("Not a game trace: %s" % path)
+        self.domain = self.header["domain"]
+        self.codec = CODECS[self.domain](**self.header["params"])
+
+    @property
+    def true_state(self):
+        return self._decode_state(self.header["true_state"])
+
+    def _decode_state(self, data):
+        return self.codec.decode_state(data) if self.decode else data
+
+    def __iter__(self):
+        codec = self.codec
+        with _open(self.path, "r") as f:
+            f.readline()  # header
+            for line in f:
+                step = json.loads(line)
+                if self.decode:
+                    step["action"] = codec.decode_action(step["action"])
+                    step["observation"] = codec.decode_observation(step["observation"])
+                    if "true_state" in step:
+                        step["true_state"] = codec.decode_state(step["true_state"])
+                    for stats in step.get("root", []):
+                        stats[0] = codec.decode_action(stats[0])
+                yield step
+
+
+def summarize(path) -> dict:
+    """Aggregate statistics of a trace, read in one streaming pass."""
+    reader = TraceReader(path, decode=False)
+    moves, total_reward, planning_time = 0, 0.0, 0.0
+    for step in reader:
+        moves += 1
+        total_reward += step["reward"]
+        planning_time += step.get("planning_time", 0.0)
+    return {
+        "domain": reader.domain,
+        "moves": moves,
+        "total_reward": total_reward,
+        "planning_time": planning_time,
+    }
+
+
+def replay(path, delay=0.5, gui=False) -> None:
+    """Prints each step of a trace; with `gui`, also draws battleship games."""
+    reader = TraceReader(path)
+    board = None
+    if gui:
+        if reader.domain != "battleship":
+            raise ValueError("The replay window only draws battleship games")
+        from envs.battleship.render import BoardRenderer
+
+        board = BoardRenderer()
+        board.set_occupancy(reader.true_state.occupancy())
+        board.draw()
+
+    print(">> True state:", reader.true_state)
+    for step in reader:
+        line = "%3d %s -> %s, reward %s" % (
+            step["step"],
+            step["action"],
+            step["observation"],
+            step["reward"],
+        )
+        if "root" in step:
+            line += ", %d root visits" % sum(visits for _, visits, _ in step["root"])
+        if "belief" in step:
+            line += ", %(particles)d particles (%(distinct)d distinct)" % step["belief"]
+        print(line)
+        if board is not None:
+            if not board.handle_events():
+                break
+            action = step["action"]
+            board.shoot(
+                action.coord.x, action.coord.y, step["observation"].name == "hit"
+            )
+            board.draw()
+        time.sleep(delay)
+    if board is not None:
+        board.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("mode", choices=["summary", "replay"])
+    parser.add_argument("path")
+    parser.add_argument("--delay", type=float, default=0.5)
+    parser.add_argument("--gui", action="store_true")
+    args = parser.parse_args()
+
+    if args.mode == "summary":
+        print(summarize(args.path))
+    else:
+        replay(args.path, args.delay, args.gui)
@@ -1,5 +1,5 @@
 import numpy as np
-import random
+from rng import default_rng
 
 
 class Histogram:
@@ -61,16 +61,15 @@ class Histogram:
         """
         return max(self._histogram, key=self._histogram.get)
 
-    def random(self):
+    def random(self, rng=None):
         """
-        random(self)
+        random(self, rng=None)
         Randomly sample a value based on the probability
         in the histogram"""
+        if rng is None:
+            rng = default_rng()
         candidates = list(self._histogram.keys())
-        prob_dist = []
-        for value in candidates:
-            prob_dist.append(self._histogram[value])
-        return np.random.choice(candidates, 1, p=prob_dist)[0]
+        return rng.choices(candidates, self._histogram.values())
 
     def get_histogram(self):
         """get_histogram(self)
@@ -94,10 +93,14 @@ def update_histogram_belief(
     targs={},
     normalize=True,
     static_transition=False,
+    next_state_space=None,
 ):
     new_histogram = {}  # state space still the same.
     total_prob = 0
 
+    if next_state_space is None:
+        next_state_space = list(current_histogram)
+
     for next_state in next_state_space:
         observation_prob = observation_model.probability(
             real_observation, next_state, real_action, **oargs
@@ -123,3 +126,158 @@ def update_histogram_belief(
             if total_prob > 0:
                 new_histogram[state] /= total_prob
     return Histogram(new_histogram)
+
+
+class BeliefTensors:
+    """
+    Matrix form of the transition and observation models of a discrete POMDP,
+    for exact belief updates over large state spaces.
+
+    __init__(self, states, actions, observations, transition_model,
+             observation_model, action_key=None, sparse=False, max_pairs=10**6)
+
+    The tensors are built once from the models: `T[a][s, s'] = P(s' | s, a)`
+    and `Z[a][s', o] = P(o | s', a)`. A model with a `support` method fills its
+    rows from it, `transition_model.support(s, a)` and
+    `observation_model.support(s', a)` returning the (next state or observation,
+    probability) pairs of non-zero probability, so that building costs one call
+    per row. Other models are called through `probability` for every pair, which
+    is only done up to `max_pairs` pairs per tensor.
+    Actions with the same `action_key(action)` are assumed to share their
+    tensors, which are then only built for the first such action.
+    A belief is a vector over `states`; `update` costs one matrix-vector
+    product and a normalization instead of O(|S|^2) model calls.
+
+    Args:
+        sparse (bool): store the tensors as `scipy.sparse` CSR matrices, built
+            from their non-zero entries only. Requires scipy. Default: False.
+        max_pairs (int): largest |S| x |S| or |S| x |O| tensor built pair by
+            pair from a model without `support`. Default: 10**6.
+    """
+
+    def __init__(
+        self,
+        states,
+        actions,
+        observations,
+        transition_model,
+        observation_model,
+        action_key=None,
+        sparse=False,
+        max_pairs=10**6,
+    ):
+        self.states = list(states)
+        self.observations = list(observations)
+        self._state_index = {s: i for i, s in enumerate(self.states)}
+        self._observation_index = {o: i for i, o in enumerate(self.observations)}
+        self._action_key = action_key if action_key is not None else lambda a: a
+        self.sparse = sparse
+        self.max_pairs = max_pairs
+
+        self._transitions = {}
+        self._observation_matrices = {}
+        for action in actions:
+            key = self._action_key(action)
+            if key in self._transitions:
+                continue
+            self._transitions[key] = self._build(
+                transition_model,
+                action,
+                self.states,
+                self._state_index,
+                lambda s, sp_: transition_model.probability(sp_, s, action),
+            )
+            self._observation_matrices[key] = self._build(
+                observation_model,
+                action,
+                self.observations,
+                self._observation_index,
+                lambda sp_, o: observation_model.probability(o, sp_, action),
+            )
+
+    def _build(self, model, action, cols, col_index, prob):
+        """Matrix over `self.states` x `cols`, from `model.support` if the model
+        has one, else from `prob(row, col)` for every pair."""
+        if hasattr(model, "support"):
+
+            def entries(r):
+                return ((col_index[c], p) for c, p in model.support(r, action))
+
+        else:
+            if len(self.states) * len(cols) > self.max_pairs:
+                raise ValueError(
+                    "%d x %d tensor over the pairs of a model without `support`"
+                    % (len(self.states), len(cols))
+                )
+
+            def entries(r):
+                return ((j, prob(r, c)) for j, c in enumerate(cols))
+
+        if self.sparse:
+            return self._build_sparse(self.states, len(cols), entries)
+        matrix = np.zeros((len(self.states), len(cols)))
+        for i, r in enumerate(self.states):
+            for j, p in entries(r):
+                matrix[i, j] += p
+        return matrix
+
+    @staticmethod
+    def _build_sparse(rows, num_cols, entries):
+        """CSR matrix filled row by row with the non-zero `entries(r)`: the
+        dense matrix is never held in memory."""
+        from scipy import sparse as sp
+
+        data, indices, indptr = [], [], [0]
+        for r in rows:
+            for j, p in entries(r):
+                if p != 0:
+                    data.append(p)
+                    indices.append(j)
+            indptr.append(len(data))
+        matrix = sp.csr_matrix(
+            (
+                np.asarray(data, dtype=np.float64),
+                np.asarray(indices, dtype=np.int64),
+                np.asarray(indptr, dtype=np.int64),
+            ),
+            shape=(len(rows), num_cols),
+        )
+        matrix.sum_duplicates()
+        return matrix
+
+    def transition(self, action):
+        """Returns the |S| x |S| transition matrix of `action`."""
+        return self._transitions[self._action_key(action)]
+
+    def observation(self, action):
+        """Returns the |S| x |O| observation matrix of `action`."""
+        return self._observation_matrices[self._action_key(action)]
+
+    def uniform(self) -> np.ndarray:
+        return np.full(len(self.states), 1 / len(self.states))
+
+    def from_histogram(self, histogram) -> np.ndarray:
+        belief = np.zeros(len(self.states))
+        for state in histogram:
+            belief[self._state_index[state]] = histogram[state]
+        return belief
+
+    def to_histogram(self, belief) -> Histogram:
+        return Histogram({s: float(p) for s, p in zip(self.states, belief) if p > 0})
+
+    def update(self, belief, real_action, real_observation, normalize=True):
+        """update(self, belief, real_action, real_observation, normalize=True)
+        Returns the belief vector after taking `real_action` and
+        receiving `real_observation`."""
+        predicted = self.transition(real_action).T @ belief
+        column = self.observation(real_action)[
+            :, self._observation_index[real_observation]
+        ]
+        if not isinstance(column, np.ndarray):  # sparse column
+            column = column.toarray().ravel()
+        new_belief = np.multiply(column, predicted)
+        if normalize:
+            total_prob = new_belief.sum()
+            if total_prob > 0:
+                new_belief /= total_prob
+        return new_belief
@@ -1,9 +1,13 @@
+import logging
+
 from pomcp import POUCT, POMCP
-from generator import Histogram, random, update_histogram_belief
-from particles import Particles
+from generator import Histogram, update_histogram_belief
+from particles import Particles, KLDParticleCount
+
+logger = logging.getLogger(__name__)
 
 
-def test_pomcp(problem, nsteps=10) -> None:
+def test_pomcp(problem, nsteps=10, viewer=None) -> None:
 
     planner = POMCP(
         agent=problem.agent,
@@ -13,16 +17,23 @@ def test_pomcp(problem, nsteps=10) -> None:
         c_UCB=110,
         value_init=-100,
         rollout_policy=problem.agent.policy_model,
+        num_particles=KLDParticleCount(
+            min_particles=100, max_particles=len(problem.agent.init_belief)
+        ),
     )
 
+    if viewer is not None:
+        viewer.set_state(problem.env.cur_state)
+
     for i in range(nsteps):  # Step 4
 
-        print("==== Step %d ====" % (i + 1))
-        print(">> True state:", problem.env.cur_state)
-        # print(">> Belief:", problem.agent.cur_belief)
+        logger.info("==== Step %d ====", i + 1)
+        logger.info(">> True state: %s", problem.env.cur_state)
+        logger.debug(">> Belief: %s", problem.agent.cur_belief)
 
         action = planner.plan()
-        print(">> Action:", action)
+        planner.ponder(action)  # search on while the environment responds
+        logger.info(">> Action: %s", action)
 
         reward = problem.env.reward_model.sample(
             problem.env.cur_state, action, problem.agent.history, None
@@ -30,24 +41,26 @@ def test_pomcp(problem, nsteps=10) -> None:
         observation = problem.agent.observation_model.sample(
             problem.env.cur_state, action
         )
-        print(">> Reward:", reward)
-        print(">> Observation:", observation)
+        logger.info(">> Reward: %s", reward)
+        logger.info(">> Observation: %s", observation)
+
+        if viewer is not None:
+            viewer.shot(action, observation)  # drawn by the viewer's process
+        if reward != -1:
+            planner.stop_pondering()
+            break
+        input("Press enter to continue...")  # the planner ponders meanwhile
 
         # Step 5
         # Update the belief. If the planner is POMCP, planner.update
         # also automatically updates agent belief.
+        planner.stop_pondering()
         problem.agent.update_history(action, observation)
         planner.update(problem.agent, action, observation, problem.state_transform_func)
 
-        if reward != -1:
-            break
-
-        problem.env.cur_state.render(history=problem.agent.history)
-        print("\n")
-        print(input("Press enter to continue..."))
-
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
 
     ######### Tiger #########
 
@@ -74,6 +87,7 @@ if __name__ == "__main__":
         Action_Battleship,
     )
     from envs.battleship.problem import Problem_Battleship
+    from envs.battleship.render import RenderProcess
 
     init_true_state = generate_random_state()
 
@@ -89,6 +103,9 @@ if __name__ == "__main__":
         c_UCB=10,
         value_init=0,
         rollout_policy=battleship_problem.agent.policy_model,
+        num_particles=KLDParticleCount(min_particles=100, max_particles=n_particles),
     )
 
-    test_pomcp(battleship_problem, nsteps=100)
+    viewer = RenderProcess()
+    test_pomcp(battleship_problem, nsteps=100, viewer=viewer)
+    viewer.close()
@@ -1,6 +1,14 @@
-import random
 from generator import Histogram
+from rng import RNG, default_rng
+from concurrent.futures import FIRST_COMPLETED, wait
+from statistics import NormalDist
+import numpy as np
 import copy
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
 
 
 class Particles:
@@ -90,13 +98,13 @@ class Particles:
         return particles
 
     @classmethod
-    def from_histogram(cls, histogram, numparticles=1000):
+    def from_histogram(cls, histogram, numparticles=1000, rng=None):
         """Given a pomdp_py.Histogram return a particle representation of it,
         which is an approximation"""
         particles = []
 
         for _ in range(numparticles):
-            particles.append(histogram.random())
+            particles.append(histogram.random(rng))
         return Particles(particles)
 
     def get_histogram(self) -> Histogram:
@@ -107,14 +115,49 @@ class Particles:
             hist[s] = hist[s] / len(self.particles)
         return Histogram(hist)
 
-    def random(self):
+    def random(self, rng=None):
         """Samples a value based on the particles"""
+        if rng is None:
+            rng = default_rng()
         if len(self.particles) > 0:
-            return random.choice(self.particles)
+            return rng.choice(self.particles)
         else:
             return None
 
 
+class KLDParticleCount:
+    """
+    Adaptive particle count in the style of KLD-sampling (Fox, 2003).
+
+    __init__(self, min_particles=100, max_particles=1000, epsilon=0.05, delta=0.01)
+
+    With k the number of distinct particles (the belief's observed support size),
+    the count is the number of samples that bounds the KL divergence between the
+    particle approximation and the belief by `epsilon` with probability 1 - `delta`:
+
+        n = (k - 1) / (2 epsilon) * (1 - 2 / (9 (k - 1)) + sqrt(2 / (9 (k - 1))) z)^3
+
+    where z is the upper 1 - `delta` quantile of the standard normal, and n is
+    clipped to [min_particles, max_particles].
+    """
+
+    def __init__(self, min_particles=100, max_particles=1000, epsilon=0.05, delta=0.01):
+        self.min_particles = min_particles
+        self.max_particles = max_particles
+        self.epsilon = epsilon
+        self._z = NormalDist().inv_cdf(1 - delta)
+
+    def bound(self, k) -> int:
+        if k <= 1:
+            return self.min_particles
+        a = 2 / (9 * (k - 1))
+        n = (k - 1) / (2 * self.epsilon) * (1 - a + math.sqrt(a) * self._z) ** 3
+        return min(max(math.ceil(n), self.min_particles), self.max_particles)
+
+    def __call__(self, particles) -> int:
+        return self.bound(len(set(particles)))
+
+
 def sample_generative_model(agent, state, action, discount_factor=1.0) -> tuple:
     assert not hasattr(action, "policy")
 
@@ -150,29 +193,251 @@ def sample_explict_models(
         return next_state, reward
 
 
-from tqdm import tqdm
+def supports_batch(agent) -> bool:
+    """True if all of the agent's models implement `sample_batch`."""
+    return all(
+        hasattr(model, "sample_batch")
+        for model in (
+            agent.transition_model,
+            agent.observation_model,
+            agent.reward_model,
+        )
+    )
+
+
+def sample_generative_model_batch(agent, states, actions, histories=None) -> tuple:
+    """Batched counterpart of `sample_generative_model`.
+
+    Models may implement
+        transition_model.sample_batch(states, actions)
+        observation_model.sample_batch(next_states, actions)
+        reward_model.sample_batch(states, actions, history, next_states)
+    returning arrays aligned with `states`; models that do not are
+    sampled one item at a time.
+    `histories` gives each item its own history in place of `agent.history`
+    (e.g. for items of several agents sharing the models); it is passed on to
+    `reward_model.sample_batch` as the `histories` keyword.
+    Returns (next_states, observations, rewards) as numpy arrays."""
+    history = agent.history
+    transition_model = agent.transition_model
+    observation_model = agent.observation_model
+    reward_model = agent.reward_model
+
+    if hasattr(transition_model, "sample_batch"):
+        next_states = transition_model.sample_batch(states, actions)
+    else:
+        next_states = np.empty(len(states), dtype=object)
+        next_states[:] = [
+            transition_model.sample(s, a) for s, a in zip(states, actions)
+        ]
+
+    if hasattr(reward_model, "sample_batch"):
+        # only models that need per-item histories take them
+        kwargs = {} if histories is None else {"histories": histories}
+        rewards = reward_model.sample_batch(
+            states, actions, history, next_states, **kwargs
+        )
+    elif histories is not None:
+        rewards = np.array(
+            [
+                reward_model.sample(s, a, h, sp)
+                for s, a, h, sp in zip(states, actions, histories, next_states)
+            ],
+            dtype=float,
+        )
+    else:
+        rewards = np.array(
+            [
+                reward_model.sample(s, a, history, sp)
+                for s, a, sp in zip(states, actions, next_states)
+            ],
+            dtype=float,
+        )
+
+    if hasattr(observation_model, "sample_batch"):
+        observations = observation_model.sample_batch(next_states, actions)
+    else:
+        observations = np.empty(len(states), dtype=object)
+        observations[:] = [
+            observation_model.sample(sp, a) for sp, a in zip(next_states, actions)
+        ]
+    return next_states, observations, rewards
 
 
 def particle_reinvigoration(
-    particles: Particles, numparticles, history, state_transform_func
+    particles: Particles,
+    numparticles,
+    history,
+    state_transform_func,
+    show_progress=False,
+    pbar_update_interval=5,
+    rng=None,
 ) -> Particles:
+    """Adds `state_transform_func(state, history, rng)` of random source particles
+    until there are `numparticles`. With `show_progress`, a tqdm progress bar is
+    updated every `pbar_update_interval` new particles. The source particles and
+    the transforms draw from `rng`."""
+    if rng is None:
+        rng = default_rng()
     # If not enough particles, introduce artificial noise to existing particles (reinvigoration)
     newparticles = copy.deepcopy(particles)
     if len(newparticles) == 0:
         raise ValueError("Particle deprivation.")
-    if len(newparticles) > numparticles:
+    if len(newparticles) >= numparticles:
         return newparticles
+    logger.debug(
+        "reinvigorating %d particles from %d",
+        numparticles - len(newparticles),
+        len(particles),
+    )
 
-    # Use tqdm to create a progress bar
-    with tqdm(
-        total=numparticles - len(newparticles), desc="Reinvigorating particles"
-    ) as pbar:
-        while len(newparticles) < numparticles:
-            # need to make a copy otherwise the transform affects states in 'particles'
-            state = particles.random()
-            next_state = state_transform_func(state, history)
-
-            newparticles.add(next_state)
-            pbar.update(1)  # Increment the progress bar by one step for each iteration
+    pbar = None
+    if show_progress:
+        from tqdm import tqdm  # imported on use, to keep worker startup fast
+
+        pbar = tqdm(
+            total=numparticles - len(newparticles), desc="Reinvigorating particles"
+        )
+    pending = 0
+    while len(newparticles) < numparticles:
+        # need to make a copy otherwise the transform affects states in 'particles'
+        state = particles.random(rng)
+        next_state = state_transform_func(state, history, rng)
+
+        newparticles.add(next_state)
+        if pbar is not None:
+            pending += 1
+            if pending >= pbar_update_interval:
+                pbar.update(pending)
+                pending = 0
+    if pbar is not None:
+        pbar.update(pending)
+        pbar.close()
 
     return newparticles
+
+
+def _reinvigorate_chunk(
+    sources, history, state_transform_func, seed, deadline=None
+) -> tuple:
+    """Worker task: transforms `sources` with its own RNG stream, stopping early
+    once `deadline` (as `time.time()`) has passed. Also returns the counters of
+    the transform, if it keeps any."""
+    rng = RNG(seed)
+    counters = None
+    if hasattr(state_transform_func, "counters"):
+        counters = state_transform_func.counters()
+    start_time = time.time()
+    states = []
+    for state in sources:
+        if deadline is not None and time.time() > deadline:
+            break
+        states.append(state_transform_func(state, history, rng))
+    transform_time = time.time() - start_time
+    if counters is not None:
+        counters = (state_transform_func.counters(), counters)
+    return states, transform_time, counters
+
+
+def parallel_particle_reinvigoration(
+    particles: Particles,
+    numparticles,
+    history,
+    state_transform_func,
+    executor,
+    chunk_size=16,
+    time_budget=None,
+    seed=None,
+    rng=None,
+) -> tuple:
+    """Same as `particle_reinvigoration`, with the transform calls spread across
+    the processes of `executor` (a `concurrent.futures.ProcessPoolExecutor`) in
+    chunks of `chunk_size`, each with an independent RNG stream spawned from
+    `seed`. The source particles are drawn from `rng`.
+
+    `state_transform_func` must be picklable (e.g. a module-level function or
+    a staticmethod). If `time_budget` (seconds) runs out, the chunks not started
+    yet are cancelled, the running ones stop after their current transform, and
+    the partial belief is returned; the pool is idle again on return.
+
+    Returns (particles, stats), stats being a dict of counters:
+    `completion_rate` is generated / requested, and `acceptance_rate` the share of
+    the transform's proposals accepted in this call (None if it keeps no counters)."""
+    if len(particles) == 0:
+        raise ValueError("Particle deprivation.")
+    newparticles = Particles(list(particles.particles))
+    requested = max(numparticles - len(newparticles), 0)
+    stats = {
+        "requested": requested,
+        "generated": 0,
+        "completion_rate": 1.0,
+        "acceptance_rate": None,
+        "chunks_done": 0,
+        "chunks_cancelled": 0,
+        "transform_time": 0.0,
+        "time": 0.0,
+    }
+    if requested == 0:
+        return newparticles, stats
+
+    start_time = time.time()
+    deadline = None
+    if time_budget is not None:
+        deadline = start_time + time_budget
+    sizes = [chunk_size] * (requested // chunk_size)
+    if requested % chunk_size:
+        sizes.append(requested % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    pending = set()
+    for size, seed_seq in zip(sizes, seeds):
+        sources = [particles.random(rng) for _ in range(size)]
+        pending.add(
+            executor.submit(
+                _reinvigorate_chunk,
+                sources,
+                history,
+                state_transform_func,
+                seed_seq,
+                deadline,
+            )
+        )
+
+    proposals, accepts = 0, 0
+
+    def collect(done) -> None:
+        nonlocal proposals, accepts
+        for future in done:
+            states, transform_time, counters = future.result()
+            if counters is not None:
+                state_transform_func.merge_counters(*counters)
+                after, before = counters
+                proposals += sum(after["proposals"].values())
+                proposals -= sum(before["proposals"].values())
+                accepts += sum(after["accepts"].values())
+                accepts -= sum(before["accepts"].values())
+            for state in states:
+                newparticles.add(state)
+            stats["chunks_done"] += 1
+            stats["transform_time"] += transform_time
+
+    while pending:
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        collect(done)
+
+    # chunks already running cannot be cancelled; they stop at the deadline
+    running = [future for future in pending if not future.cancel()]
+    stats["chunks_cancelled"] = len(pending) - len(running)
+    collect(wait(running).done)
+
+    stats["generated"] = len(newparticles) - len(particles)
+    stats["completion_rate"] = stats["generated"] / requested
+    if proposals:
+        stats["acceptance_rate"] = accepts / proposals
+    stats["time"] = time.time() - start_time
+    return newparticles, stats
@@ -1,12 +1,24 @@
-from particles import Particles, sample_generative_model, particle_reinvigoration
+from particles import (
+    Particles,
+    sample_generative_model,
+    sample_generative_model_batch,
+    supports_batch,
+    particle_reinvigoration,
+    parallel_particle_reinvigoration,
+)
+from profiling import SearchStats, timed
+from rng import default_rng
+import numpy as np
 import copy
 import time
-import random
 import math
-from tqdm import tqdm
+import threading
+import logging
 from typing import Any
 from agent import Agent
 
+logger = logging.getLogger(__name__)
+
 
 class TreeNode:
     def __init__(self):
@@ -130,9 +142,37 @@ class POUCT:
             If both `num_sims` and `planning_time` are negative, then the planner will run for 1 second.
         rollout_policy (RolloutPolicy): rollout policy. Default: RandomRollout.
         action_prior (ActionPrior): a prior over preferred actions given state and history.
+        rollout_batch_size (int): number of rollouts run from each new leaf, averaged.
+            If the agent's models implement `sample_batch`, the rollouts are stepped
+            together with one batched call per step. Default: 1.
+        early_stop (bool): stop searching before the budget is used up once the
+            best valued root action is settled: it must also be the most visited
+            one, with a lead in visits the runner-up cannot close within the
+            remaining budget. The reason is "visit_share" if it also holds at least
+            `early_stop_visit_share` of the root visits, "confidence" if its UCB
+            lower bound is above every other action's upper bound, and
+            "unreachable" otherwise. Checked every `early_stop_interval`
+            simulations after `early_stop_min_sims`. The search returns the best
+            valued action either way. The reason the search stopped is kept in
+            `_last_stop_reason`. Default: False.
+        profile (bool): time the phases of the search (selection, expansion, rollouts,
+            generative model, belief updates) and keep a `profiling.SearchStats` of
+            each `plan` call in `_last_stats`. When off, the search is not
+            instrumented at all. Default: False.
+        opening_book: object whose `lookup(history)` returns a precomputed action
+            for the history, or None (e.g. `envs.battleship.opening_book.OpeningBook`).
+            `plan` returns a book action without searching and drops the search
+            tree; `_last_stop_reason` is then "book". Default: None.
+        rng (rng.RNG): stream of the planner's own draws (root samples, belief
+            subsampling, reinvigoration sources); the models keep their own.
+            Default: `rng.default_rng()`.
 
     """
 
+    # called through the planner so that profiling can wrap them
+    _generative_model = staticmethod(sample_generative_model)
+    _generative_model_batch = staticmethod(sample_generative_model_batch)
+
     def __init__(
         self,
         agent: Agent,
@@ -144,6 +184,14 @@ class POUCT:
         num_visits_init=0,
         value_init=0,
         rollout_policy=None,
+        rollout_batch_size=1,
+        early_stop=False,
+        early_stop_visit_share=0.9,
+        early_stop_min_sims=100,
+        early_stop_interval=50,
+        profile=False,
+        opening_book=None,
+        rng=None,
     ):
         self._max_depth = max_depth
         self._planning_time = planning_time
@@ -152,27 +200,255 @@ class POUCT:
         self.num_visits_init = num_visits_init
         self.value_init = value_init
         self.rollout_policy = rollout_policy
+        self.rollout_batch_size = rollout_batch_size
+        self._batched = rollout_batch_size > 1 and supports_batch(agent)
 
         self.discount_factor = discount_factor
         self.c_UCB = c_UCB
 
+        self._early_stop = early_stop
+        self._early_stop_visit_share = early_stop_visit_share
+        self._early_stop_min_sims = early_stop_min_sims
+        self._early_stop_interval = early_stop_interval
+
         # to simplify function calls; plan only for one agent at a time
         self.agent = agent
         self._last_num_sims = -1
         self._last_planning_time = -1
+        self._last_stop_reason = None
+
+        self._ponder_thread = None
+        self._ponder_stop = None
+        self._last_ponder_sims = 0
+        self._deadline = None
+
+        self._opening_book = opening_book
+        self._rng = rng if rng is not None else default_rng()
+
+        self._profile = profile
+        self._stats = SearchStats()
+        self._last_stats = None
+        if profile:
+            self._instrument()
+
+    def _instrument(self) -> None:
+        # instance attributes shadow the methods; the class is left untouched
+        self._ucb = timed(self, "select", self._ucb)
+        self._expand_ornode = timed(self, "expand", self._expand_ornode)
+        self.rollout = timed(self, "rollout", self.rollout)
+        self.rollout_batch = timed(self, "rollout", self.rollout_batch)
+        self._generative_model = timed(self, "generative_model", self._generative_model)
+        self._generative_model_batch = timed(
+            self, "generative_model", self._generative_model_batch
+        )
+        if hasattr(self, "_add_particle"):  # POMCP
+            self._add_particle = timed(self, "belief_add", self._add_particle)
+
+    def _finish_stats(self, sims_count, time_taken) -> None:
+        if not self._profile:
+            return
+        stats, self._stats = self._stats, SearchStats()
+        stats.num_sims = sims_count
+        stats.planning_time = time_taken
+        stats.record_tree(self.agent.tree)
+        self._last_stats = stats
 
     def plan(self) -> Any:
+        self.stop_pondering()
         if not hasattr(self.agent, "tree"):
             setattr(self.agent, "tree", None)
+        if self._opening_book is not None:
+            action = self._opening_book.lookup(self.agent.history)
+            if action is not None:
+                self.agent.tree = None  # the next search starts from the new root
+                self._last_num_sims = 0
+                self._last_planning_time = 0.0
+                self._last_stop_reason = "book"
+                logger.debug("book move %s", action)
+                return action
+        self._stats = SearchStats()
         action, time_taken, sims_count = self._search()
         self._last_num_sims = sims_count
         self._last_planning_time = time_taken
+        self._finish_stats(sims_count, time_taken)
+        logger.debug(
+            "planned %s: %d sims in %.3fs (%s)",
+            action,
+            sims_count,
+            time_taken,
+            self._last_stop_reason,
+        )
+        return action
+
+    def ponder(self, action) -> None:
+        """Keeps simulating the subtrees under `action`, the action returned by
+        `plan`, in a background thread while the environment responds.
+        `update` and the next search stop it, and `update` adopts the matching
+        subtree with its extra visits; call `stop_pondering` before changing the
+        agent's history. The thread draws its root samples from a stream spawned
+        from the planner's; the models' streams are shared with the caller."""
+        self.stop_pondering()
+        if self.agent.tree is None or self.agent.tree[action] is None:
+            return
+        self._ponder_stop = threading.Event()
+        self._ponder_thread = threading.Thread(
+            target=self._ponder,
+            args=(
+                action,
+                list(self.agent.history),
+                self._ponder_stop,
+                self._rng.spawn(1)[0],
+            ),
+            daemon=True,
+        )
+        self._last_ponder_sims = 0
+        self._ponder_thread.start()
+
+    def _ponder(self, action, history, stop, rng) -> None:
+        root = self.agent.tree
+        while not stop.is_set():
+            state = self.agent.sample_belief(rng)
+            self._simulate_action(state, history, root, action, 0)
+            self._last_ponder_sims += 1
+
+    def stop_pondering(self) -> int:
+        """Stops pondering, if any; returns the number of simulations it ran."""
+        if self._ponder_thread is None:
+            return 0
+        self._ponder_stop.set()
+        self._ponder_thread.join()
+        self._ponder_thread = None
+        return self._last_ponder_sims
+
+    async def plan_async(self, slice_sims=50, on_progress=None, deadline=None) -> Any:
+        """Same as `plan`, but runs the simulations in slices of `slice_sims` and
+        yields to the event loop between them. `on_progress(action, num_visits)`
+        is called with the interim best action after each slice.
+
+        `deadline` (as `time.time()`) replaces the `planning_time` budget; it can
+        be moved with `set_deadline` or `extend_deadline` while planning. If the
+        task is cancelled, the tree keeps the statistics of the simulations done
+        so far."""
+        action = None
+        async for action, num_visits in self.iter_plan_async(slice_sims, deadline):
+            if on_progress is not None:
+                on_progress(action, num_visits)
         return action
 
+    async def iter_plan_async(self, slice_sims=50, deadline=None):
+        """Async generator over (best action, its visit count) after each slice
+        of simulations; see `plan_async`."""
+        import asyncio  # already loaded by the running event loop
+
+        self.stop_pondering()
+        if not hasattr(self.agent, "tree"):
+            setattr(self.agent, "tree", None)
+        sims_count = 0
+        start_time = time.time()
+        self._deadline = deadline
+        self._stats = SearchStats()
+        if deadline is None and self._num_sims <= 0:
+            self._deadline = start_time + self._planning_time
+
+        try:
+            while True:
+                reason = self._async_stop_reason(sims_count, start_time)
+                if reason is not None:
+                    break
+                for _ in range(slice_sims):
+                    state = self.agent.sample_belief(self._rng)
+                    self._do_simulate(state)
+                    sims_count += 1
+                    if self._async_stop_reason(sims_count, start_time, early=False):
+                        break
+
+                self._last_num_sims = sims_count
+                self._last_planning_time = time.time() - start_time
+                best_action = self.agent.tree.select_best_action()
+                yield best_action, self.agent.tree[best_action].num_visits  # type: ignore
+                await asyncio.sleep(0)
+        except asyncio.CancelledError:
+            self._last_stop_reason = "cancelled"
+            raise
+        finally:
+            self._last_num_sims = sims_count
+            self._last_planning_time = time.time() - start_time
+            self._finish_stats(sims_count, self._last_planning_time)
+        self._last_stop_reason = reason
+
+    def iter_plan_leaves(self, deadline=None):
+        """Generator version of `plan` that leaves the rollouts to the caller,
+        e.g. to step the rollouts of several planners together: yields
+        (state, history, depth) at the new leaf of each simulation, is sent the
+        rollout's return, and returns the chosen action.
+
+        Stops as `plan_async`, with the same `deadline`, checking the early stop
+        rules every `early_stop_interval` simulations."""
+        self.stop_pondering()
+        if not hasattr(self.agent, "tree"):
+            setattr(self.agent, "tree", None)
+        sims_count = 0
+        start_time = time.time()
+        self._deadline = deadline
+        self._stats = SearchStats()
+        if deadline is None and self._num_sims <= 0:
+            self._deadline = start_time + self._planning_time
+
+        try:
+            while True:
+                early = sims_count % self._early_stop_interval == 0
+                reason = self._async_stop_reason(sims_count, start_time, early)
+                if reason is not None:
+                    break
+                state = self.agent.sample_belief(self._rng)
+                yield from self._simulate_deferred(
+                    state, self.agent.history, self.agent.tree, None, None, 0
+                )
+                sims_count += 1
+        finally:
+            self._last_num_sims = sims_count
+            self._last_planning_time = time.time() - start_time
+            self._finish_stats(sims_count, self._last_planning_time)
+        self._last_stop_reason = reason
+        return self.agent.tree.select_best_action()
+
+    def _async_stop_reason(self, sims_count, start_time, early=True) -> str | None:
+        if self._num_sims > 0 and sims_count >= self._num_sims:
+            return "num_sims"
+        if (
+            self._deadline is not None
+            and sims_count > 0
+            and time.time() > self._deadline
+        ):
+            return "deadline"
+        if early and self._early_stop and sims_count >= self._early_stop_min_sims:
+            return self._early_stop_reason(sims_count, start_time, self._deadline)
+        return None
+
+    def set_budget(self, planning_time=-1.0, num_sims=-1) -> None:
+        """Sets the budget of the next searches, as the `planning_time` and
+        `num_sims` of the constructor."""
+        self._planning_time = planning_time
+        self._num_sims = num_sims
+
+    def set_deadline(self, deadline) -> None:
+        """Sets the absolute time (as `time.time()`) at which the running
+        `plan_async` stops; a search started later takes its own `deadline`."""
+        self._deadline = deadline
+
+    def extend_deadline(self, seconds) -> None:
+        """Moves the deadline of `plan_async` by `seconds` (may be negative)."""
+        if self._deadline is None:
+            self._deadline = time.time()
+        self._deadline += seconds
+
     def _do_simulate(self, state):
         self._simulate(state, self.agent.history, self.agent.tree, None, None, 0)
 
     def update(self, agent, real_action, real_observation) -> None:
+        self.stop_pondering()
+        if agent.tree is None:
+            return  # e.g. after a book move; the next `plan` starts a new tree
         if (
             real_action not in agent.tree
             or real_observation not in agent.tree[real_action]
@@ -199,12 +475,25 @@ class POUCT:
         sims_count = 0
         start_time = time.time()
 
-        while not self._should_stop(sims_count, start_time):
-            state = self.agent.sample_belief()
+        while True:
+            if self._should_stop(sims_count, start_time):
+                self._last_stop_reason = (
+                    "num_sims" if self._num_sims > 0 else "planning_time"
+                )
+                break
+            if (
+                self._early_stop
+                and sims_count >= self._early_stop_min_sims
+                and sims_count % self._early_stop_interval == 0
+            ):
+                self._last_stop_reason = self._early_stop_reason(sims_count, start_time)
+                if self._last_stop_reason is not None:
+                    break
+            state = self.agent.sample_belief(self._rng)
             self._do_simulate(state)
             sims_count += 1
 
-        best_action = self.agent.tree.select_best_action()  # type: ignore
+        best_action = self.agent.tree.select_best_action()
         time_taken = time.time() - start_time
         return best_action, time_taken, sims_count
 
@@ -213,7 +502,47 @@ class POUCT:
         if self._num_sims > 0:
             return sims_count >= self._num_sims
         else:
-            return time_taken > self._planning_time
+            # at least one simulation, so that there is a tree to choose from
+            return sims_count > 0 and time_taken > self._planning_time
+
+    def _early_stop_reason(self, sims_count, start_time, deadline=None) -> str | None:
+        """Returns why the search can stop now, or None if it should go on.
+        `deadline` (absolute time) replaces `planning_time` when given."""
+        root = self.agent.tree
+        if root is None or len(root.children) < 2:
+            return None
+        best_action = root.select_best_action()
+        best = root[best_action]
+        others = [root[a] for a in root.children if a != best_action]
+        runner_up = max(others, key=lambda node: node.num_visits)
+        if best.num_visits <= runner_up.num_visits:
+            return None  # not the most visited action
+
+        if self._num_sims > 0:
+            remaining = self._num_sims - sims_count
+        else:
+            if deadline is None:
+                deadline = start_time + self._planning_time
+            now = time.time()
+            time_taken = max(now - start_time, 1e-9)
+            remaining = (deadline - now) * sims_count / time_taken
+        if best.num_visits - runner_up.num_visits <= remaining:
+            return None
+
+        total_visits = sum(root[a].num_visits for a in root.children)
+        if best.num_visits >= self._early_stop_visit_share * total_visits:
+            return "visit_share"
+
+        def bound(node):
+            return self.c_UCB * math.sqrt(
+                math.log(root.num_visits + 1) / node.num_visits
+            )
+
+        if all(node.num_visits > 0 for node in others):
+            best_lower = best.value - bound(best)
+            if best_lower > max(node.value + bound(node) for node in others):
+                return "confidence"
+        return "unreachable"
 
     def _simulate(self, state, history, root, parent, observation, depth) -> float:
 
@@ -223,21 +552,71 @@ class POUCT:
 
         # if h not in T
         if root is None:
-            if self.agent.tree is None:  # type: ignore
-                root = self._get_ORNode(root=True)
-                self.agent.tree = root  # type: ignore
-                if self.agent.tree.history != self.agent.history:  # type: ignore
-                    raise ValueError("Unable to plan for the given history.")
-            else:
-                root = self._get_ORNode()
-            if parent is not None:
-                parent[observation] = root
-            self._expand_ornode(root, history, state)
+            self._add_leaf(history, parent, observation, state)
+            if self._batched:
+                return self.rollout_batch(
+                    [state] * self.rollout_batch_size, history, depth
+                )
             rollout_reward = self.rollout(state, history, depth)
-            return rollout_reward
+            for _ in range(self.rollout_batch_size - 1):
+                rollout_reward += self.rollout(state, history, depth)
+            return rollout_reward / max(self.rollout_batch_size, 1)
 
         action = self._ucb(root)
-        next_state, observation, reward = sample_generative_model(
+        return self._simulate_action(state, history, root, action, depth)
+
+    def _add_leaf(self, history, parent, observation, state) -> ORNode:
+        """Creates and expands the node of `history`, under `parent` (None for
+        the root)."""
+        if self.agent.tree is None:  # type: ignore
+            root = self._get_ORNode(root=True)
+            self.agent.tree = root  # type: ignore
+            if self.agent.tree.history != self.agent.history:  # type: ignore
+                raise ValueError("Unable to plan for the given history.")
+        else:
+            root = self._get_ORNode()
+        if parent is not None:
+            parent[observation] = root
+        self._expand_ornode(root, history, state)
+        return root
+
+    def _backup(self, root, action, total_reward) -> None:
+        root.num_visits += 1
+        root[action].num_visits += 1
+        root[action].value = root[action].value + (
+            total_reward - root[action].value
+        ) / (root[action].num_visits)
+
+    def _simulate_deferred(self, state, history, root, parent, observation, depth):
+        """Generator version of `_simulate` that leaves the rollout to the caller:
+        yields (state, history, depth) at the new leaf, is sent the rollout's
+        return, and returns the simulation's return."""
+        if depth > self._max_depth:
+            return 0
+        if root is None:
+            self._add_leaf(history, parent, observation, state)
+            return (yield state, history, depth)
+
+        action = self._ucb(root)
+        next_state, observation, reward = self._generative_model(
+            self.agent, state, action
+        )
+        total_reward = reward + self.discount_factor * (
+            yield from self._simulate_deferred(
+                next_state,
+                history + [(action, observation)],
+                root[action][observation],
+                root[action],
+                observation,
+                depth + 1,
+            )
+        )
+        self._backup(root, action, total_reward)
+        return total_reward
+
+    def _simulate_action(self, state, history, root, action, depth) -> float:
+        """Simulates `action` from the existing node `root` and backs up the return."""
+        next_state, observation, reward = self._generative_model(
             self.agent, state, action
         )
 
@@ -249,11 +628,7 @@ class POUCT:
             observation=observation,
             depth=depth + 1,
         )
-        root.num_visits += 1
-        root[action].num_visits += 1
-        root[action].value = root[action].value + (
-            total_reward - root[action].value
-        ) / (root[action].num_visits)
+        self._backup(root, action, total_reward)
         return total_reward
 
     def rollout(self, state, history, depth) -> float:
@@ -263,7 +638,7 @@ class POUCT:
 
         while depth < self._max_depth:
             action = self.rollout_policy.rollout(state, history)  # type: ignore
-            next_state, observation, reward = sample_generative_model(
+            next_state, observation, reward = self._generative_model(
                 self.agent, state, action
             )
             history = history + [(action, observation)]
@@ -273,6 +648,30 @@ class POUCT:
             state = next_state
         return total_discounted_reward
 
+    def rollout_batch(self, states, history, depth) -> float:
+        """Runs one rollout from each of `states`, stepping all of them with
+        a single call to the batched generative model.
+        Returns the mean discounted reward."""
+        histories = [history] * len(states)
+        discount = 1.0
+        total_discounted_reward = np.zeros(len(states))
+
+        while depth < self._max_depth:
+            actions = [
+                self.rollout_policy.rollout(s, h)  # type: ignore
+                for s, h in zip(states, histories)
+            ]
+            states, observations, rewards = self._generative_model_batch(
+                self.agent, states, actions
+            )
+            histories = [
+                h + [(a, o)] for h, a, o in zip(histories, actions, observations)
+            ]
+            depth += 1
+            total_discounted_reward += rewards * discount
+            discount *= self.discount_factor
+        return float(total_discounted_reward.mean())
+
     def _ucb(self, root) -> Any:
         """UCB1"""
         best_action, best_value = None, float("-inf")
@@ -304,7 +703,24 @@ class POUCT:
 class POMCP(POUCT):
     """POMCP is POUCT + particle belief representation.
     This POMCP version only works for problems
-    with action space that can be enumerated."""
+    with action space that can be enumerated.
+
+    Args:
+        lazy_belief (bool): for domains with static transitions and deterministic
+            observations (e.g. battleship). Tree nodes then store no particles;
+            the belief after (a, o) is the subset of root particles that produce
+            `o` under `a`, computed as an index subset when `update` needs it.
+        reinvigoration_workers (int): if positive, particle reinvigoration runs on a
+            pool of that many processes; `state_transform_func` must be picklable.
+        reinvigoration_time (float): wall-clock budget of a parallel reinvigoration
+            (seconds); the partial belief is used when it runs out. Default: None.
+        num_particles (int or callable): number of particles kept and generated after
+            each update, or a function of the updated particles returning it
+            (e.g. `KLDParticleCount`). Default: the size of the initial belief.
+        show_progress (bool): show a tqdm progress bar during particle
+            reinvigoration, updated every `pbar_update_interval` particles.
+            Default: False.
+    """
 
     def __init__(
         self,
@@ -320,6 +736,18 @@ class POMCP(POUCT):
         action_prior=None,
         show_progress=False,
         pbar_update_interval=5,
+        rollout_batch_size=1,
+        early_stop=False,
+        early_stop_visit_share=0.9,
+        early_stop_min_sims=100,
+        early_stop_interval=50,
+        lazy_belief=False,
+        reinvigoration_workers=0,
+        reinvigoration_time=None,
+        num_particles=None,
+        profile=False,
+        opening_book=None,
+        rng=None,
     ) -> None:
         super().__init__(
             agent=agent,
@@ -331,20 +759,129 @@ class POMCP(POUCT):
             num_visits_init=num_visits_init,
             value_init=value_init,
             rollout_policy=rollout_policy,
+            rollout_batch_size=rollout_batch_size,
+            early_stop=early_stop,
+            early_stop_visit_share=early_stop_visit_share,
+            early_stop_min_sims=early_stop_min_sims,
+            early_stop_interval=early_stop_interval,
+            profile=profile,
+            opening_book=opening_book,
+            rng=rng,
         )
+        self._lazy_belief = lazy_belief
+        self._reinvigoration_workers = reinvigoration_workers
+        self._reinvigoration_time = reinvigoration_time
+        self._reinvigoration_pool = None
+        self._last_reinvigoration_stats = None
+        self._num_particles = num_particles
+        self._last_num_particles = -1
+        self._show_progress = show_progress
+        self._pbar_update_interval = pbar_update_interval
 
     def update(
         self, agent, real_action, real_observation, state_transform_func
     ) -> None:
+        self.stop_pondering()
 
         if not isinstance(agent.cur_belief, Particles):
             raise TypeError(
                 "agent's belief is not represented in particles.\n"
                 "POMCP not usable. Please convert it to particles."
             )
-        if not hasattr(agent, "tree"):
+        if self._last_stop_reason == "book":
+            # a book move was played without searching; the opening book is for
+            # domains where the belief update is exact filtering, as in lazy mode
+            particles = agent.cur_belief.particles
+            indices = self._consistent_indices(particles, real_action, real_observation)
+            tree_belief = Particles([particles[i] for i in indices])
+        elif getattr(agent, "tree", None) is None:
             raise ValueError("Warning: agent does not have tree. Have you planned yet?")
+        elif self._lazy_belief:
+            tree_belief = self._update_lazy(agent, real_action, real_observation)
+        else:
+            tree_belief = self._update_tree(agent, real_action, real_observation)
 
+        numparticles = self._target_num_particles(agent, tree_belief)
+        if len(tree_belief) > numparticles:
+            tree_belief = Particles(
+                self._rng.sample(tree_belief.particles, numparticles)
+            )
+        self._last_num_particles = numparticles
+
+        logger.debug(
+            "%d particles after %s, %s; target %d",
+            len(tree_belief),
+            real_action,
+            real_observation,
+            numparticles,
+        )
+        agent.set_belief(
+            self._reinvigorate(
+                tree_belief,
+                numparticles,
+                agent.history,
+                state_transform_func,
+            )
+        )
+        # If observation was never encountered in simulation, then tree will be None;
+        # particle reinvigoration will occur.
+        if agent.tree is not None:
+            if self._lazy_belief:
+                agent.tree.belief = agent.cur_belief  # never mutated in lazy mode
+            else:
+                agent.tree.belief = copy.deepcopy(agent.cur_belief)
+
+    def _target_num_particles(self, agent, particles) -> int:
+        if self._num_particles is None:
+            return len(agent.init_belief.particles)
+        elif callable(self._num_particles):
+            return self._num_particles(particles)
+        else:
+            return self._num_particles
+
+    def _reinvigorate(
+        self, particles, numparticles, history, state_transform_func
+    ) -> Particles:
+        if self._reinvigoration_workers <= 0:
+            return particle_reinvigoration(
+                particles,
+                numparticles,
+                history=history,
+                state_transform_func=state_transform_func,
+                show_progress=self._show_progress,
+                pbar_update_interval=self._pbar_update_interval,
+                rng=self._rng,
+            )
+        if self._reinvigoration_pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+
+            self._reinvigoration_pool = ProcessPoolExecutor(
+                max_workers=self._reinvigoration_workers
+            )
+        # a few chunks per worker, so that a time budget can cut in between
+        chunk_size = math.ceil(
+            max(numparticles - len(particles), 1) / (4 * self._reinvigoration_workers)
+        )
+        particles, self._last_reinvigoration_stats = parallel_particle_reinvigoration(
+            particles,
+            numparticles,
+            history,
+            state_transform_func,
+            self._reinvigoration_pool,
+            chunk_size=chunk_size,
+            time_budget=self._reinvigoration_time,
+            seed=self._rng.seed_int(),
+            rng=self._rng,
+        )
+        return particles
+
+    def close(self) -> None:
+        """Shuts down the reinvigoration process pool, if any."""
+        if self._reinvigoration_pool is not None:
+            self._reinvigoration_pool.shutdown(cancel_futures=True)
+            self._reinvigoration_pool = None
+
+    def _update_tree(self, agent, real_action, real_observation) -> Particles:
         if agent.tree[real_action][real_observation] is None:
             # Never anticipated the real_observation. No reinvigoration can happen.
             raise ValueError("Particle deprivation.")
@@ -360,30 +897,60 @@ class POMCP(POUCT):
             ornode.belief,
         )
         agent.tree.children = children
+        return agent.tree.belief
 
-        tree_belief = agent.tree.belief
+    def _update_lazy(self, agent, real_action, real_observation) -> Particles:
+        particles = agent.tree.belief.particles
+        indices = self._consistent_indices(particles, real_action, real_observation)
+        belief = Particles([particles[i] for i in indices])
 
-        agent.set_belief(
-            particle_reinvigoration(
-                tree_belief,
-                len(agent.init_belief.particles),
-                history=agent.history,
-                state_transform_func=state_transform_func,
-            )
-        )
-        # If observation was never encountered in simulation, then tree will be None;
-        # particle reinvigoration will occur.
-        if agent.tree is not None:
-            agent.tree.belief = copy.deepcopy(agent.cur_belief)
+        # the subtree is kept if it was explored; the belief does not depend on it
+        ornode = None
+        if agent.tree[real_action] is not None:
+            ornode = agent.tree[real_action][real_observation]
+        if ornode is not None:
+            agent.tree = RootORNodeParticles(ornode.num_visits, agent.history, belief)
+            agent.tree.children = ornode.children
+        else:
+            agent.tree = None  # replan from the updated belief
+        return belief
+
+    def _consistent_indices(self, particles, action, observation) -> np.ndarray:
+        """Indices of the particles that produce `observation` when `action` is taken;
+        exact for static transitions and deterministic observations."""
+        transition_model = self.agent.transition_model
+        observation_model = self.agent.observation_model
+        actions = [action] * len(particles)
+
+        if hasattr(transition_model, "sample_batch"):
+            next_states = transition_model.sample_batch(particles, actions)
+        else:
+            next_states = [transition_model.sample(s, action) for s in particles]
+        if hasattr(observation_model, "sample_batch"):
+            observations = observation_model.sample_batch(next_states, actions)
+        else:
+            observations = [observation_model.sample(s, action) for s in next_states]
+        return np.flatnonzero([o == observation for o in observations])
 
     def _simulate(self, state, history, root, parent, observation, depth) -> float:
         total_reward = POUCT._simulate(
             self, state, history, root, parent, observation, depth
         )
-        if depth == 1 and root is not None:
-            root.belief.add(state)  # belief update happens as simulation goes.
+        if depth == 1 and root is not None and not self._lazy_belief:
+            self._add_particle(root.belief, state)  # belief update as simulation goes.
         return total_reward
 
+    def _simulate_deferred(self, state, history, root, parent, observation, depth):
+        total_reward = yield from POUCT._simulate_deferred(
+            self, state, history, root, parent, observation, depth
+        )
+        if depth == 1 and root is not None and not self._lazy_belief:
+            self._add_particle(root.belief, state)
+        return total_reward
+
+    def _add_particle(self, belief, state) -> None:
+        belief.add(state)
+
     def _get_ORNode(self, root=False, **kwargs) -> ORNode:
         """Returns a ORNode with default values; The function naming makes it clear
         that this function is about creating a ORNode object."""
@@ -392,7 +959,13 @@ class POMCP(POUCT):
             return RootORNodeParticles(
                 self.num_visits_init,
                 self.agent.history,
-                belief=copy.deepcopy(self.agent.cur_belief),  # type: ignore
+                belief=(
+                    self.agent.cur_belief
+                    if self._lazy_belief
+                    else copy.deepcopy(self.agent.cur_belief)  # type: ignore
+                ),
             )
+        elif self._lazy_belief:
+            return ORNode(self.num_visits_init)
         else:
             return ORNodeParticles(self.num_visits_init, belief=Particles([]))
@@ -0,0 +1,72 @@
+import time
+
+PHASES = ("select", "expand", "rollout", "generative_model", "belief_add")
+
+
+class SearchStats:
+    """
+    Timers and counters of one planning call, collected when the planner is
+    created with `profile=True` and kept in its `_last_stats`.
+
+    Phase times are cumulative and inclusive: "rollout" contains the generative
+    model calls made by rollouts, which are also counted in "generative_model".
+
+    Attributes:
+        num_sims (int): simulations run.
+        planning_time (float): wall-clock time of the call (seconds).
+        times (dict): phase -> cumulative time (seconds), for the phases in PHASES.
+        calls (dict): phase -> number of calls.
+        max_depth (int): depth of the deepest ORNode of the tree (the root is 0).
+        num_nodes (int): number of ORNodes and ANDNodes in the tree.
+    """
+
+    def __init__(self) -> None:
+        self.num_sims = 0
+        self.planning_time = 0.0
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.calls = dict.fromkeys(PHASES, 0)
+        self.max_depth = 0
+        self.num_nodes = 0
+
+    def __repr__(self):
+        return f"SearchStats({self.as_dict()})"
+
+    def as_dict(self) -> dict:
+        return {
+            "num_sims": self.num_sims,
+            "planning_time": self.planning_time,
+            "times": dict(self.times),
+            "calls": dict(self.calls),
+            "max_depth": self.max_depth,
+            "num_nodes": self.num_nodes,
+        }
+
+    def record_tree(self, tree) -> None:
+        """Sets `max_depth` and `num_nodes` from a walk of the tree."""
+        self.max_depth, self.num_nodes = 0, 0
+        if tree is None:
+            return
+        stack = [(tree, 0)]
+        while stack:
+            ornode, depth = stack.pop()
+            self.num_nodes += 1 + len(ornode.children)
+            self.max_depth = max(self.max_depth, depth)
+            for andnode in ornode.children.values():
+                for child in andnode.children.values():
+                    if child is not None:
+                        stack.append((child, depth + 1))
+
+
+def timed(planner, phase, func):
+    """Wraps `func` to add its time and call to `planner._stats` under `phase`."""
+
+    def wrapper(*args, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats = planner._stats
+            stats.times[phase] += time.perf_counter() - start_time
+            stats.calls[phase] += 1
+
+    return wrapper
@@ -0,0 +1,129 @@
+"""Explicit random number streams for the models, the particles and the planner.
+
+An `RNG` wraps a numpy `Generator` and serves scalar draws from a buffer of
+uniform floats drawn in bulk. A draw in a rollout or a reinvigoration move costs
+a list index instead of a call into numpy or `random`. Array draws (e.g. the
+batch samplers) go to `RNG.generator` directly.
+
+Streams for workers are `spawn`ed: they are statistically independent and are
+determined by the parent seed and the worker's index:
+
+    streams = RNG(seed).spawn(num_workers)
+
+Everything that draws random numbers takes an `rng` argument. When it is None,
+the process-wide stream of `default_rng()` is used, which `reseed` reseeds in
+place.
+
+A stream shared by several threads stays usable, but its draws then depend on
+the scheduling: give each thread its own `spawn`ed stream instead.
+"""
+
+import bisect
+import itertools
+import threading
+
+import numpy as np
+
+BUFFER_SIZE = 4096
+
+
+class RNG:
+    """
+    Random stream with a prefetched buffer of uniform draws.
+
+    Args:
+        seed (int or np.random.SeedSequence): None for fresh OS entropy. Default: None.
+        buffer_size (int): number of floats drawn per refill. Default: 4096.
+    """
+
+    def __init__(self, seed=None, buffer_size=BUFFER_SIZE) -> None:
+        self.buffer_size = buffer_size
+        self._refill_lock = threading.Lock()
+        self.seed(seed)
+
+    def seed(self, seed=None) -> None:
+        """Restarts the stream from `seed`; the buffered draws are dropped."""
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.seed_seq = seed
+        self.generator = np.random.Generator(np.random.PCG64(seed))
+        self._buffer = []
+        self._index = 0
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_refill_lock"]  # locks do not pickle; a copy gets its own
+        return state
+
+    def __setstate__(self, state) -> None:
+        self.__dict__.update(state)
+        self._refill_lock = threading.Lock()
+
+    def spawn(self, n) -> list["RNG"]:
+        """`n` independent child streams."""
+        return [RNG(s, self.buffer_size) for s in self.seed_seq.spawn(n)]
+
+    def random(self) -> float:
+        """Uniform float in [0, 1)."""
+        try:
+            value = self._buffer[self._index]
+        except IndexError:  # also when threads raced past the end
+            self._refill()
+            return self.random()
+        self._index += 1
+        return value
+
+    def _refill(self) -> None:
+        with self._refill_lock:
+            if self._index >= len(self._buffer):
+                self._buffer = self.generator.random(self.buffer_size).tolist()
+                self._index = 0
+
+    def uniform(self, a, b) -> float:
+        return a + (b - a) * self.random()
+
+    def randrange(self, n) -> int:
+        """Uniform int in [0, n)."""
+        return int(self.random() * n)
+
+    def randint(self, a, b) -> int:
+        """Uniform int in [a, b], both included, as `random.randint`."""
+        return a + int(self.random() * (b - a + 1))
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+    def choices(self, population, weights):
+        """One element of `population`, drawn in proportion to `weights`."""
+        cum_weights = list(itertools.accumulate(weights))
+        i = bisect.bisect_right(cum_weights, self.random() * cum_weights[-1])
+        return population[min(i, len(population) - 1)]
+
+    def sample(self, population, k) -> list:
+        """`k` distinct elements of `population`, as `random.sample`."""
+        n = len(population)
+        if not 0 <= k <= n:
+            raise ValueError("Sample larger than population or is negative")
+        # partial Fisher-Yates shuffle of the indices
+        indices = list(range(n))
+        for i in range(k):
+            j = i + int(self.random() * (n - i))
+            indices[i], indices[j] = indices[j], indices[i]
+        return [population[i] for i in indices[:k]]
+
+    def seed_int(self) -> int:
+        """A 63-bit seed drawn from the stream, e.g. for a worker task."""
+        return int(self.generator.integers(2**63))
+
+
+_default_rng = RNG()
+
+
+def default_rng() -> RNG:
+    """The process-wide stream used when no `rng` is given."""
+    return _default_rng
+
+
+def reseed(seed=None) -> None:
+    """Reseeds the process-wide stream in place."""
+    _default_rng.seed(seed)
@@ -0,0 +1,492 @@
+"""Planning service hosting many battleship games.
+
+Sessions (one per game) are spread over a pool of worker processes. Each worker
+keeps the search trees and beliefs of its sessions and runs their pending `plan`
+requests together on an asyncio loop, in rounds: a round runs one simulation of
+every pending search, then steps the rollouts from all the new leaves together
+through the models' `sample_batch`. Belief updates run on a thread of the worker
+while the other sessions keep searching.
+
+Each worker draws from its own stream spawned from the service's seed, and each
+session from a stream spawned from its worker's, so a session's games only
+depend on the seed and the order in which its worker's sessions were opened.
+
+The service can be used in-process (`PlanningService`) or over a local socket
+(`serve` and `SocketClient`, authenticated with a shared key; see `auth`), both
+exposing the same methods:
+
+    client.new_session() -> session_id
+    client.plan(session_id) -> action
+    client.update(session_id, action, observation)
+    client.close_session(session_id)
+
+Run `python server.py bench` to measure throughput in games/hour.
+"""
+
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import threading
+import time
+
+import numpy as np
+
+from agent import Agent
+from auth import check_authkey, cli_authkey
+from particles import Particles, sample_generative_model_batch
+from pomcp import POMCP
+from rng import RNG
+from envs.battleship.types import generate_random_state
+from envs.battleship.mh_kernel import MHKernel_Battleship
+from envs.battleship.policy_model import PolicyModel_Battleship
+from envs.battleship.transition_model import TransitionModel_Battleship
+from envs.battleship.observation_model import ObservationModel_Battleship
+from envs.battleship.reward_model import RewardModel_Battleship
+
+DEFAULT_PLANNER_CONFIG = {
+    "max_depth": 5,
+    "discount_factor": 1.0,
+    "num_sims": 500,
+    "c_UCB": 10,
+    "value_init": 0,
+    "lazy_belief": True,
+}
+
+
+class _Session:
+    def __init__(self, agent, planner, rng) -> None:
+        self.agent = agent
+        self.planner = planner
+        # bounded reinvigoration time per particle
+        self.state_transform_func = MHKernel_Battleship(rng=rng)
+        # a session serves its requests one at a time
+        self.lock = asyncio.Lock()
+
+
+class _Search:
+    """A `plan` request in progress: the planner's `iter_plan_leaves` generator,
+    the return of the last rollout sent to it and the future of the action."""
+
+    def __init__(self, planner, future) -> None:
+        self.planner = planner
+        self.steps = planner.iter_plan_leaves()
+        self.future = future
+        self.rollout_value = None
+
+
+class _Worker:
+    """Serves the requests for the sessions assigned to one worker process."""
+
+    def __init__(self, conn, planner_config, num_particles, seed) -> None:
+        self.conn = conn
+        self.planner_config = planner_config
+        self.num_particles = num_particles
+        self.rng = RNG(seed)
+        self.sessions = {}
+        self.searches = []
+
+        # the battleship transition, observation and reward models are
+        # deterministic, so all sessions share them
+        self.models = {
+            "transition_model": TransitionModel_Battleship(),
+            "observation_model": ObservationModel_Battleship(),
+            "reward_model": RewardModel_Battleship(),
+        }
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._closed = loop.create_future()
+        self._has_searches = asyncio.Event()
+        loop.add_reader(self.conn.fileno(), self._on_readable)
+        rounds = asyncio.ensure_future(self._run_searches())
+        await self._closed
+        rounds.cancel()
+        loop.remove_reader(self.conn.fileno())
+
+    def _on_readable(self) -> None:
+        while not self._closed.done() and self.conn.poll():
+            try:
+                request_id, method, session_id, args = self.conn.recv()
+            except EOFError:
+                self._closed.set_result(None)
+                return
+            if method == "shutdown":
+                self._closed.set_result(None)
+                return
+            asyncio.ensure_future(self._handle(request_id, method, session_id, args))
+
+    async def _handle(self, request_id, method, session_id, args) -> None:
+        try:
+            result = await getattr(self, "_" + method)(session_id, *args)
+        except Exception as e:
+            self.conn.send((request_id, False, e))
+        else:
+            self.conn.send((request_id, True, result))
+
+    async def _run_searches(self) -> None:
+        while True:
+            if not self.searches:
+                self._has_searches.clear()
+                await self._has_searches.wait()
+            self._run_round()
+            await asyncio.sleep(0)  # serve the requests received meanwhile
+
+    def _run_round(self) -> None:
+        """Runs one simulation of each pending search."""
+        leaves = []
+        for search in list(self.searches):
+            try:
+                leaf = search.steps.send(search.rollout_value)
+            except StopIteration as stop:
+                self.searches.remove(search)
+                search.future.set_result(stop.value)
+            except Exception as e:
+                self.searches.remove(search)
+                search.future.set_exception(e)
+            else:
+                leaves.append((search, leaf))
+        if not leaves:
+            return
+        values = self._rollouts([(s.planner, leaf) for s, leaf in leaves])
+        for (search, _), value in zip(leaves, values):
+            search.rollout_value = value
+
+    def _rollouts(self, leaves) -> np.ndarray:
+        """Mean returns of the `rollout_batch_size` rollouts of each
+        (planner, (state, history, depth)) leaf, all stepped together."""
+        owners, planners, states, histories, depths = [], [], [], [], []
+        for i, (planner, (state, history, depth)) in enumerate(leaves):
+            for _ in range(max(planner.rollout_batch_size, 1)):
+                owners.append(i)
+                planners.append(planner)
+                states.append(state)
+                histories.append(history)
+                depths.append(depth)
+        returns = np.zeros(len(states))
+        discounts = np.ones(len(states))
+
+        while True:
+            active = [
+                k for k in range(len(states)) if depths[k] < planners[k]._max_depth
+            ]
+            if not active:
+                break
+            actions = [
+                planners[k].rollout_policy.rollout(states[k], histories[k])
+                for k in active
+            ]
+            # every session's agent holds the shared models
+            next_states, observations, rewards = sample_generative_model_batch(
+                planners[active[0]].agent,
+                [states[k] for k in active],
+                actions,
+                histories=[planners[k].agent.history for k in active],
+            )
+            for j, k in enumerate(active):
+                returns[k] += discounts[k] * rewards[j]
+                discounts[k] *= planners[k].discount_factor
+                states[k] = next_states[j]
+                histories[k] = histories[k] + [(actions[j], observations[j])]
+                depths[k] += 1
+
+        counts = np.bincount(owners, minlength=len(leaves))
+        return np.bincount(owners, weights=returns, minlength=len(leaves)) / counts
+
+    async def _new_session(self, session_id) -> None:
+        (rng,) = self.rng.spawn(1)
+        init_belief = Particles(
+            [generate_random_state(rng) for _ in range(self.num_particles)]
+        )
+        policy_model = PolicyModel_Battleship(rng)
+        agent = Agent(init_belief, policy_model=policy_model, **self.models)
+        planner = POMCP(
+            agent=agent, rollout_policy=policy_model, rng=rng, **self.planner_config
+        )
+        self.sessions[session_id] = _Session(agent, planner, rng)
+
+    async def _plan(self, session_id):
+        session = self.sessions[session_id]
+        async with session.lock:
+            search = _Search(
+                session.planner, asyncio.get_running_loop().create_future()
+            )
+            self.searches.append(search)
+            self._has_searches.set()
+            return await search.future
+
+    async def _update(self, session_id, action, observation) -> None:
+        session = self.sessions[session_id]
+        async with session.lock:
+            session.agent.update_history(action, observation)
+            await asyncio.get_running_loop().run_in_executor(
+                None,
+                session.planner.update,
+                session.agent,
+                action,
+                observation,
+                session.state_transform_func,
+            )
+
+    async def _close_session(self, session_id) -> None:
+        session = self.sessions.pop(session_id)
+        async with session.lock:
+            session.planner.close()
+
+
+def _worker_main(conn, planner_config, num_particles, seed) -> None:
+    worker = _Worker(conn, planner_config, num_particles, seed)
+    asyncio.run(worker.run())
+
+
+class PlanningService:
+    """
+    In-process client of a pool of planning worker processes.
+
+    Args:
+        num_workers (int): number of worker processes. Default: 2.
+        planner_config (dict): keyword arguments of each session's `POMCP`.
+            Default: `DEFAULT_PLANNER_CONFIG`.
+        num_particles (int): size of each session's initial belief. Default: 1000.
+        seed (int): root seed of the workers' streams; None for fresh OS
+            entropy. Default: None.
+    """
+
+    def __init__(
+        self,
+        num_workers=2,
+        planner_config=None,
+        num_particles=1000,
+        seed=None,
+    ) -> None:
+        if planner_config is None:
+            planner_config = DEFAULT_PLANNER_CONFIG
+        self._request_ids = itertools.count()
+        self._session_ids = itertools.count()
+        self._pending = {}
+        self._workers = []
+        for stream in RNG(seed).spawn(num_workers):
+            conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_worker_main,
+                args=(child_conn, planner_config, num_particles, stream.seed_seq),
+                daemon=True,
+            )
+            process.start()
+            reader = threading.Thread(target=self._read, args=(conn,), daemon=True)
+            reader.start()
+            self._workers.append((conn, threading.Lock(), process))
+
+    def _read(self, conn) -> None:
+        while True:
+            try:
+                request_id, ok, result = conn.recv()
+            except (EOFError, OSError):
+                return
+            future = self._pending.pop(request_id)
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(result)
+
+    def submit(self, method, session_id, *args) -> Future:
+        """Sends a request to the worker hosting `session_id`; returns a future."""
+        request_id = next(self._request_ids)
+        future = Future()
+        self._pending[request_id] = future
+        conn, lock, _ = self._workers[session_id % len(self._workers)]
+        with lock:
+            conn.send((request_id, method, session_id, args))
+        return future
+
+    def new_session(self) -> int:
+        session_id = next(self._session_ids)
+        self.submit("new_session", session_id).result()
+        return session_id
+
+    def plan(self, session_id):
+        return self.submit("plan", session_id).result()
+
+    def update(self, session_id, action, observation) -> None:
+        self.submit("update", session_id, action, observation).result()
+
+    def close_session(self, session_id) -> None:
+        self.submit("close_session", session_id).result()
+
+    def shutdown(self) -> None:
+        for conn, lock, process in self._workers:
+            with lock:
+                conn.send((None, "shutdown", None, ()))
+            process.join()
+            conn.close()
+        self._workers = []
+
+
+def serve(service, address, authkey) -> None:
+    """Serves `service` on a socket, one thread per client connection
+    authenticated with `authkey`."""
+    check_authkey(authkey)
+    with Listener(address, authkey=authkey) as listener:
+        while True:
+            try:
+                conn = listener.accept()
+            except AuthenticationError:
+                continue  # a client with the wrong key
+            threading.Thread(
+                target=_serve_client, args=(service, conn), daemon=True
+            ).start()
+
+
+def _serve_client(service, conn) -> None:
+    with conn:
+        while True:
+            try:
+                method, args = conn.recv()
+            except EOFError:
+                return
+            try:
+                result = getattr(service, method)(*args)
+            except Exception as e:
+                conn.send((False, e))
+            else:
+                conn.send((True, result))
+
+
+class SocketClient:
+    """Client of a service run by `serve`; one connection per client, so use
+    one client per thread."""
+
+    def __init__(self, address, authkey) -> None:
+        self._conn = Client(address, authkey=authkey)
+
+    def _call(self, method, *args):
+        self._conn.send((method, args))
+        ok, result = self._conn.recv()
+        if not ok:
+            raise result
+        return result
+
+    def new_session(self) -> int:
+        return self._call("new_session")
+
+    def plan(self, session_id):
+        return self._call("plan", session_id)
+
+    def update(self, session_id, action, observation) -> None:
+        self._call("update", session_id, action, observation)
+
+    def close_session(self, session_id) -> None:
+        self._call("close_session", session_id)
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def play_game(client, max_moves=100) -> int:
+    """Plays one game against a random true state; returns the number of moves.
+    The session is closed even if a request fails."""
+    true_state = generate_random_state()
+    observation_model = ObservationModel_Battleship()
+    reward_model = RewardModel_Battleship()
+    history = []
+
+    session_id = client.new_session()
+    try:
+        for move in range(1, max_moves + 1):
+            action = client.plan(session_id)
+            reward = reward_model.sample(true_state, action, history, None)
+            observation = observation_model.sample(true_state, action)
+            history.append((action, observation))
+            if reward != -1:
+                break
+            client.update(session_id, action, observation)
+    finally:
+        client.close_session(session_id)
+    return move
+
+
+def benchmark(make_client, num_games, concurrency, max_moves=100) -> dict:
+    """Plays `num_games` games, `concurrency` at a time, each thread with its
+    own client from `make_client()`. Returns throughput statistics over the
+    games played to the end; the games that raised are counted in `errors`,
+    with their exceptions in `failures`."""
+    games = iter(range(num_games))
+    moves = []
+    failures = []
+    lock = threading.Lock()
+
+    def player():
+        client = make_client()
+        while True:
+            with lock:
+                if next(games, None) is None:
+                    return
+            try:
+                n = play_game(client, max_moves)
+            except Exception as e:
+                with lock:
+                    failures.append(repr(e))
+                continue
+            with lock:
+                moves.append(n)
+
+    start_time = time.time()
+    threads = [threading.Thread(target=player) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    time_taken = time.time() - start_time
+    return {
+        "games": len(moves),
+        "errors": len(failures),
+        "failures": failures,
+        "moves": sum(moves),
+        "time": time_taken,
+        "games_per_hour": 3600 * len(moves) / time_taken,
+        "moves_per_second": sum(moves) / time_taken,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("mode", choices=["serve", "bench"])
+    parser.add_argument("--port", type=int, default=6000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--particles", type=int, default=1000)
+    parser.add_argument("--num-sims", type=int, default=500)
+    parser.add_argument("--games", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-moves", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--socket", action="store_true", help="benchmark through a local socket"
+    )
+    args = parser.parse_args()
+
+    config = dict(DEFAULT_PLANNER_CONFIG, num_sims=args.num_sims)
+    service = PlanningService(
+        num_workers=args.workers,
+        planner_config=config,
+        num_particles=args.particles,
+        seed=args.seed,
+    )
+    address = ("localhost", args.port)
+    authkey, generated = cli_authkey(address[0])
+    if args.mode == "serve":
+        if generated:
+            print(">> Authkey:", authkey.decode())
+        serve(service, address, authkey)
+    else:
+        make_client = lambda: service
+        if args.socket:
+            threading.Thread(
+                target=serve, args=(service, address, authkey), daemon=True
+            ).start()
+            time.sleep(0.5)
+            make_client = lambda: SocketClient(address, authkey)
+        print(benchmark(make_client, args.games, args.concurrency, args.max_moves))
+        service.shutdown()
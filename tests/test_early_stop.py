@@ -0,0 +1,86 @@
+from agent import Agent
+from particles import Particles
+from pomcp import POMCP
+from rng import RNG
+
+NUM_SIMS = 500
+
+
+class Arm:
+    def __init__(self, index) -> None:
+        self.index = index
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Arm) and self.index == other.index
+
+    def __hash__(self) -> int:
+        return hash(self.index)
+
+
+ARMS = [Arm(0), Arm(1), Arm(2)]
+MEANS = [0.3, 0.45, 0.6]
+
+
+class BanditModels:
+    """One-step bandit whose arms pay their mean plus uniform noise in
+    [-0.5, 0.5): the value order of the arms keeps changing early in the search.
+    Serves as the policy, transition, observation and reward model."""
+
+    def __init__(self, rng) -> None:
+        self.rng = rng
+
+    def get_all_actions(self, state=None, history=None):
+        return ARMS
+
+    def rollout(self, state, history):
+        return self.rng.choice(ARMS)
+
+    def sample(self, state, action, history=None, next_state=None):
+        if history is None:  # transition and observation: nothing changes
+            return state
+        return MEANS[action.index] + self.rng.random() - 0.5
+
+
+def plan(seed, early_stop, c_UCB=0.3, num_sims=NUM_SIMS):
+    rng = RNG(seed)
+    models = BanditModels(rng)
+    agent = Agent(
+        Particles(["s"]),
+        policy_model=models,
+        transition_model=models,
+        observation_model=models,
+        reward_model=models,
+    )
+    planner = POMCP(
+        agent=agent,
+        rollout_policy=models,
+        max_depth=0,
+        num_sims=num_sims,
+        c_UCB=c_UCB,
+        early_stop=early_stop,
+        rng=rng,
+    )
+    action = planner.plan()
+    return action, planner._last_stop_reason
+
+
+def test_early_stop_keeps_the_chosen_action():
+    stopped = 0
+    for seed in range(50):
+        action, reason = plan(seed, early_stop=True)
+        if reason != "num_sims":
+            stopped += 1
+        # same stream, no early stop: the search runs its whole budget
+        full_action, full_reason = plan(seed, early_stop=False)
+        assert full_reason == "num_sims"
+        assert action == full_action
+    assert stopped > 0
+
+
+def test_full_budget_search_returns_the_best_valued_action():
+    # fewer simulations than `early_stop_min_sims`, and enough exploration for
+    # the most visited arm to differ from the best valued one in some searches
+    for seed in range(50):
+        action, reason = plan(seed, early_stop=True, c_UCB=2.0, num_sims=30)
+        assert reason == "num_sims"
+        assert action == plan(seed, early_stop=False, c_UCB=2.0, num_sims=30)[0]
@@ -0,0 +1,114 @@
+import math
+import time
+
+
+class TimeControl:
+    """
+    Game-level time budget around a POUCT/POMCP planner.
+
+    Each move gets the remaining game time divided by the expected number of
+    remaining moves, scaled up when the belief is concentrated (low entropy, a
+    critical move) and down when the reused search tree already concentrates
+    its root visits on one action (an easy decision). Time left over by moves
+    that finish early (e.g. with `early_stop`) is spent on later moves.
+
+    Args:
+        planner (POUCT): the planner; its budget is set with `set_budget` before
+            each move.
+        total_time (float): time budget of the whole game (seconds), covering
+            both `plan` and `update` calls.
+        expected_moves (int): expected number of moves in a game. Default: 50.
+        min_moves_left (int): lower bound of the expected number of remaining
+            moves, so that a game running past `expected_moves` does not spend
+            its remaining time on a single move. Default: 10.
+        min_move_time (float): lower bound of a move's budget (seconds). Default: 0.01.
+        max_move_time (float): upper bound of a move's budget (seconds). Default: None.
+        entropy_weight (float): exponent of the belief entropy factor. Default: 1.
+        concentration_weight (float): exponent of the root visit concentration
+            factor. Default: 1.
+        moves_left (callable): function of the agent returning the expected number
+            of remaining moves; overrides `expected_moves`. Default: None.
+    """
+
+    def __init__(
+        self,
+        planner,
+        total_time,
+        expected_moves=50,
+        min_moves_left=10,
+        min_move_time=0.01,
+        max_move_time=None,
+        entropy_weight=1.0,
+        concentration_weight=1.0,
+        moves_left=None,
+    ) -> None:
+        self.planner = planner
+        self.total_time = total_time
+        self.expected_moves = expected_moves
+        self.min_moves_left = min_moves_left
+        self.min_move_time = min_move_time
+        self.max_move_time = max_move_time
+        self.entropy_weight = entropy_weight
+        self.concentration_weight = concentration_weight
+        self._moves_left = moves_left
+
+        self.time_used = 0.0
+        self.moves_played = 0
+        self._last_budget = -1
+
+    @property
+    def time_left(self) -> float:
+        return max(self.total_time - self.time_used, 0.0)
+
+    def moves_left(self) -> int:
+        if self._moves_left is not None:
+            return max(self._moves_left(self.planner.agent), self.min_moves_left)
+        return max(self.expected_moves - self.moves_played, self.min_moves_left)
+
+    def belief_entropy(self) -> float:
+        """Entropy of the agent's particle belief, normalized by its maximum
+        log(number of particles)."""
+        belief = self.planner.agent.cur_belief
+        histogram = belief.get_histogram()
+        if len(histogram) <= 1:
+            return 0.0
+        entropy = -sum(p * math.log(p) for p in histogram.histogram.values())
+        return entropy / math.log(len(belief))
+
+    def visit_concentration(self) -> float:
+        """Share of the root visits of the most visited action, 0 without a tree."""
+        tree = getattr(self.planner.agent, "tree", None)
+        if tree is None or not tree.children:
+            return 0.0
+        visits = [tree[action].num_visits for action in tree.children]
+        if sum(visits) == 0:
+            return 0.0
+        return max(visits) / sum(visits)
+
+    def move_budget(self) -> float:
+        """Planning time (seconds) allocated to the next move; never below
+        `min_move_time`, even once the game budget is spent."""
+        budget = self.time_left / self.moves_left()
+        budget *= (1.5 - self.belief_entropy()) ** self.entropy_weight
+        budget *= (1.5 - self.visit_concentration()) ** self.concentration_weight
+
+        budget = min(budget, self.time_left)
+        if self.max_move_time is not None:
+            budget = min(budget, self.max_move_time)
+        return max(budget, self.min_move_time)
+
+    def plan(self):
+        self._last_budget = self.move_budget()
+        self.planner.set_budget(planning_time=self._last_budget)
+
+        start_time = time.time()
+        action = self.planner.plan()
+        self.time_used += time.time() - start_time
+        self.moves_played += 1
+        return action
+
+    def update(self, *args, **kwargs) -> None:
+        """Forwards to the planner's `update`, charging its time to the game."""
+        start_time = time.time()
+        self.planner.update(*args, **kwargs)
+        self.time_used += time.time() - start_time
@@ -0,0 +1,244 @@
+"""Headless batch of seeded self-play episodes over a process pool.
+
+Each episode plays POMCP against a random true state until the game ends (all
+ships sunk in battleship, a door opened in Tiger) or `--max-moves` is reached.
+Per-episode results are appended to a JSONL file as episodes finish:
+
+    {"episode": 0, "domain": "battleship", "seed": 0, "moves": 41,
+     "total_reward": -40.0, "planning_time": 12.3, "reinvigoration_time": 3.4,
+     "finished": true, "error": null}
+
+Episode i draws all its random numbers from the i-th stream spawned from
+`--seed` (see `rng`), so any episode can be replayed on its own.
+
+With `--trace-dir`, each episode is also recorded as a game trace (see
+`game_trace`).
+
+    python tournament.py battleship --episodes 1000 --workers 8 --output results.jsonl
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from particles import Particles
+from pomcp import POMCP
+from rng import RNG, default_rng
+from game_trace import TraceWriter
+from envs.battleship.types import generate_random_state
+from envs.battleship.problem import Problem_Battleship
+from envs.battleship.mh_kernel import MHKernel_Battleship
+from envs.tiger.types import State_Tiger
+from envs.tiger.problem import Problem_Tiger
+from envs.tiger.posterior_kernel import PosteriorKernel_Tiger
+
+DEFAULT_CONFIGS = {
+    "battleship": {
+        "max_depth": 5,
+        "discount_factor": 1.0,
+        "num_sims": 500,
+        "c_UCB": 10,
+        "value_init": 0,
+        "lazy_belief": True,
+    },
+    "tiger": {
+        "max_depth": 5,
+        "discount_factor": 0.95,
+        "num_sims": 500,
+        "c_UCB": 110,
+    },
+}
+
+
+def make_battleship_problem(num_particles, n=None, rng=None) -> tuple:
+    init_belief = Particles([generate_random_state(rng) for _ in range(num_particles)])
+    problem = Problem_Battleship(generate_random_state(rng), init_belief, rng)
+    # bounded reinvigoration time per particle
+    return problem, MHKernel_Battleship(rng=rng)
+
+
+def make_tiger_problem(num_particles, n=2, rng=None) -> tuple:
+    if rng is None:
+        rng = default_rng()
+    states = [State_Tiger.from_index(i, n) for i in range(n)]
+    init_belief = Particles([rng.choice(states) for _ in range(num_particles)])
+    problem = Problem_Tiger(n, 0.1, rng.choice(states), init_belief, rng)
+    # particles drawn from the exact posterior
+    return problem, PosteriorKernel_Tiger(
+        init_belief, problem.agent.observation_model, rng=rng
+    )
+
+
+PROBLEMS = {
+    "battleship": make_battleship_problem,
+    "tiger": make_tiger_problem,
+}
+
+
+def play_episode(
+    episode, domain, seed, planner_config, num_particles, max_moves, n=2, trace_dir=None
+) -> dict:
+    """Plays one seeded episode, on the stream `RNG(seed).spawn(...)[episode]`;
+    returns its result record. With `trace_dir`, the episode is recorded there
+    as a game trace."""
+    rng = RNG(np.random.SeedSequence(seed, spawn_key=(episode,)))
+    problem, state_transform_func = PROBLEMS[domain](num_particles, n, rng)
+    agent = problem.agent
+    planner = POMCP(
+        agent=agent, rollout_policy=agent.policy_model, rng=rng, **planner_config
+    )
+    true_state = problem.env.cur_state
+
+    result = {
+        "episode": episode,
+        "domain": domain,
+        "seed": seed,
+        "moves": 0,
+        "total_reward": 0.0,
+        "planning_time": 0.0,
+        "reinvigoration_time": 0.0,
+        "finished": False,
+        "error": None,
+    }
+    trace = None
+    try:
+        if trace_dir is not None:
+            trace = TraceWriter(
+                os.path.join(trace_dir, "episode-%06d.jsonl.gz" % episode),
+                domain,
+                true_state,
+                planner_config,
+                params={"n": n} if domain == "tiger" else None,
+            )
+        for _ in range(max_moves):
+            start_time = time.time()
+            action = planner.plan()
+            planning_time = time.time() - start_time
+            result["planning_time"] += planning_time
+
+            reward = problem.env.reward_model.sample(
+                true_state, action, agent.history, None
+            )
+            observation = agent.observation_model.sample(true_state, action)
+            if trace is not None:
+                trace.step(
+                    action,
+                    observation,
+                    reward,
+                    tree=agent.tree,
+                    belief=agent.cur_belief,
+                    planning_time=planning_time,
+                )
+            result["moves"] += 1
+            result["total_reward"] += reward
+            if reward != -1:
+                result["finished"] = True
+                break
+
+            agent.update_history(action, observation)
+            start_time = time.time()
+            planner.update(agent, action, observation, state_transform_func)
+            result["reinvigoration_time"] += time.time() - start_time
+    except Exception as e:
+        result["error"] = repr(e)
+    finally:
+        planner.close()
+        if trace is not None:
+            trace.close()
+    return result
+
+
+def run_tournament(
+    domain,
+    num_episodes,
+    output,
+    num_workers=None,
+    seed=0,
+    planner_config=None,
+    num_particles=1000,
+    max_moves=100,
+    n=2,
+    trace_dir=None,
+) -> dict:
+    """Plays `num_episodes` episodes on `num_workers` processes, appending each
+    result to the JSONL file `output` as it finishes. Returns aggregate statistics."""
+    if planner_config is None:
+        planner_config = DEFAULT_CONFIGS[domain]
+    if trace_dir is not None:
+        os.makedirs(trace_dir, exist_ok=True)
+    results = []
+    start_time = time.time()
+    with open(output, "a") as f, ProcessPoolExecutor(
+        max_workers=num_workers
+    ) as executor:
+        futures = [
+            executor.submit(
+                play_episode,
+                episode,
+                domain,
+                seed,
+                planner_config,
+                num_particles,
+                max_moves,
+                n,
+                trace_dir,
+            )
+            for episode in range(num_episodes)
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            f.write(json.dumps(result) + "\n")
+            f.flush()
+            results.append(result)
+    time_taken = time.time() - start_time
+
+    played = [r for r in results if r["error"] is None]
+    finished = [r for r in played if r["finished"]]
+    return {
+        "episodes": len(results),
+        "errors": len(results) - len(played),
+        "finished": len(finished),
+        "mean_moves": float(np.mean([r["moves"] for r in played])) if played else None,
+        "mean_reward": (
+            float(np.mean([r["total_reward"] for r in played])) if played else None
+        ),
+        "time": time_taken,
+        "episodes_per_hour": 3600 * len(played) / time_taken,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("domain", choices=sorted(PROBLEMS))
+    parser.add_argument("--episodes", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="tournament.jsonl")
+    parser.add_argument("--particles", type=int, default=1000)
+    parser.add_argument("--num-sims", type=int, default=None)
+    parser.add_argument("--max-moves", type=int, default=100)
+    parser.add_argument("--doors", type=int, default=2, help="Tiger only")
+    parser.add_argument("--trace-dir", default=None, help="record game traces here")
+    args = parser.parse_args()
+
+    config = dict(DEFAULT_CONFIGS[args.domain])
+    if args.num_sims is not None:
+        config["num_sims"] = args.num_sims
+    summary = run_tournament(
+        args.domain,
+        args.episodes,
+        args.output,
+        num_workers=args.workers,
+        seed=args.seed,
+        planner_config=config,
+        num_particles=args.particles,
+        max_moves=args.max_moves,
+        n=args.doors,
+        trace_dir=args.trace_dir,
+    )
+    for key, value in summary.items():
+        print("%s: %s" % (key, value))